@@ -0,0 +1,235 @@
+import argparse
+import json
+import os
+import platform
+import random
+import statistics
+import sys
+import time
+import uuid
+from datetime import date, timedelta
+
+import matplotlib
+matplotlib.use('Agg')
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+
+import data
+import logic
+
+# Нагрузочные замеры горячих путей data/logic/ui на синтетических портфелях.
+#   python benchmark.py                       # замер и сравнение с эталоном
+#   python benchmark.py --sizes 1000 100000   # только выбранные размеры
+#   python benchmark.py --update-baseline     # сохранить результаты как эталон
+DEFAULT_SIZES = (1000, 100000, 1000000)
+DATA_DIR = 'benchmark_data'
+RESULTS_FILE = 'benchmark_results.json'
+BASELINE_FILE = 'benchmark_baseline.json'
+REGRESSION_THRESHOLD = 0.25
+# Разница меньше этой величины считается шумом измерений.
+REGRESSION_MIN_SECONDS = 0.001
+ASSETS_COUNT = 300
+BROKERS = ['Freedom Broker', 'Halyk Finance', 'Jusan Invest', 'BCC Invest', 'Tabys', 'Interactive Brokers']
+EXCHANGES = ['KASE', 'AIX', 'NYSE', 'NASDAQ', 'MOEX']
+CURRENCIES = ['KZT', 'USD', 'EUR', 'RUB']
+
+# --- Генерация данных ---
+def _zipf_weights(count, exponent):
+    return [1 / (rank ** exponent) for rank in range(1, count + 1)]
+
+def generate_transactions(count, seed=42):
+    rng = random.Random(seed)
+    assets = [f"T{index:03d}" for index in range(ASSETS_COUNT)]
+    asset_weights = _zipf_weights(len(assets), 1.1)
+    broker_weights = _zipf_weights(len(BROKERS), 1.5)
+    prices = {asset: round(rng.lognormvariate(3, 1.2), 2) for asset in assets}
+    start = date(2015, 1, 1)
+    span = (date(2025, 12, 31) - start).days
+    transactions = []
+    chosen_assets = rng.choices(assets, weights=asset_weights, k=count)
+    chosen_brokers = rng.choices(BROKERS, weights=broker_weights, k=count)
+    for index in range(count):
+        asset = chosen_assets[index]
+        quantity = rng.randint(1, 500)
+        price = round(prices[asset] * rng.uniform(0.7, 1.3), 2)
+        day = start + timedelta(days=rng.randrange(span))
+        transactions.append({
+            'id': str(uuid.UUID(int=rng.getrandbits(128), version=4)),
+            'date': day.isoformat(),
+            'company_name': f"Компания {asset}",
+            'asset': asset,
+            'action': 'Покупка' if rng.random() < 0.7 else 'Продажа',
+            'quantity': quantity,
+            'price_per_share': price,
+            'total_cost': quantity * price,
+            'currency': rng.choices(CURRENCIES, weights=[60, 30, 5, 5])[0],
+            'exchange': rng.choice(EXCHANGES),
+            'broker': chosen_brokers[index],
+            'settlement_date': (day + timedelta(days=2)).isoformat(),
+            'deal_number': f"D{index:08d}"
+        })
+    return transactions
+
+def dataset_path(count, seed):
+    os.makedirs(DATA_DIR, exist_ok=True)
+    path = os.path.join(DATA_DIR, f"investments_{count}_{seed}.json")
+    if not os.path.exists(path):
+        with open(path, 'w', encoding='utf-8') as file:
+            json.dump(generate_transactions(count, seed), file, ensure_ascii=False, indent=2)
+    return path
+
+def sqlite_dataset_path(json_path):
+    # С FORTUNEST_STORAGE=sqlite замеряется база, перенесённая из того же
+    # набора, а не investments.db в текущей папке.
+    path = os.path.splitext(json_path)[0] + '.db'
+    if not os.path.exists(path):
+        data.INVESTMENTS_FILE = json_path
+        data.SQLITE_FILE = path
+        data.migrate_json_to_sqlite()
+    return path
+
+# --- Замеры ---
+def measure(func, repeat, setup=None):
+    timings = []
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        started = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - started)
+    return {'median': statistics.median(timings), 'min': min(timings), 'runs': repeat}
+
+def _reload():
+    data.invalidate_cache()
+    data.load_transactions()
+
+class OffscreenAllocationChart(logic.AllocationChart):
+    def _create_canvas(self):
+        return FigureCanvasAgg(self.figure)
+
+def _chart_refresh(chart):
+    # Фигура создаётся один раз, как в окне; замеряется обновление на месте.
+    chart.update(logic.get_asset_totals())
+    chart.canvas.draw()
+
+def _treeview_setup():
+    # Treeview требует дисплей; без него этот замер пропускается.
+    import tkinter as tk
+    from tkinter import ttk
+    import ui
+    try:
+        root = tk.Tk()
+    except tk.TclError:
+        return None
+    root.withdraw()
+    ui.root = root
+    ui.tree = ttk.Treeview(root, columns=ui.TABLE_COLUMNS, show='headings')
+    ui.table_scrollbar = ttk.Scrollbar(root)
+    ui.empty_state = tk.Frame(root)
+    return root
+
+def run_size(count, seed, repeat):
+    path = dataset_path(count, seed)
+    if data.STORAGE_BACKEND == 'sqlite':
+        data.SQLITE_FILE = sqlite_dataset_path(path)
+        storage_path = data.SQLITE_FILE
+    else:
+        data.INVESTMENTS_FILE = path
+        storage_path = path
+    data.invalidate_cache()
+    results = {'file_bytes': os.path.getsize(storage_path)}
+    results['load_transactions'] = measure(data.load_transactions, repeat, setup=data.invalidate_cache)
+    transactions = list(data.load_transactions())
+    results['save_transactions'] = measure(lambda: data.save_transactions(transactions), repeat)
+    results['get_stats_cold'] = measure(logic.get_stats, repeat, setup=_reload)
+    results['get_stats'] = measure(logic.get_stats, repeat)
+    results['get_asset_totals'] = measure(logic.get_asset_totals, repeat)
+    top_asset = max(logic.get_asset_totals(), key=logic.get_asset_totals().get)
+    results['filter_transactions_all'] = measure(
+        lambda: logic.filter_transactions('Все активы', 'Все действия', 'Все брокеры'), repeat)
+    results['filter_transactions_asset'] = measure(
+        lambda: logic.filter_transactions(top_asset, 'Все действия', 'Все брокеры'), repeat)
+    results['filter_transactions_combined'] = measure(
+        lambda: logic.filter_transactions(top_asset, 'Продажа', BROKERS[0]), repeat)
+    chart = OffscreenAllocationChart(None)
+    _chart_refresh(chart)
+    results['chart_refresh'] = measure(lambda: _chart_refresh(chart), repeat)
+
+    root = _treeview_setup()
+    if root is not None:
+        import ui
+        rows = logic.filter_transactions('Все активы', 'Все действия', 'Все брокеры')
+
+        def refresh():
+            logic.get_stats()
+            logic.get_distinct_values('asset')
+            logic.get_distinct_values('broker')
+            ui.show_table_rows(rows)
+            _chart_refresh(chart)
+
+        results['treeview_populate'] = measure(lambda: ui.show_table_rows(rows), repeat)
+        results['full_refresh'] = measure(refresh, repeat, setup=_reload)
+        root.destroy()
+    else:
+        results['treeview_populate'] = None
+        results['full_refresh'] = None
+    return results
+
+# --- Сравнение с эталоном ---
+def compare(results, baseline, threshold):
+    regressions = []
+    for size, measurements in results['sizes'].items():
+        reference = baseline.get('sizes', {}).get(size, {})
+        for name, current in measurements.items():
+            previous = reference.get(name)
+            if not isinstance(current, dict) or not isinstance(previous, dict):
+                continue
+            ratio = current['median'] / previous['median'] if previous['median'] else 1
+            marker = ''
+            if ratio > 1 + threshold and current['median'] - previous['median'] > REGRESSION_MIN_SECONDS:
+                marker = '  <-- регрессия'
+                regressions.append((size, name, ratio))
+            print(f"{size:>9} {name:<30} {current['median'] * 1000:10.2f} мс  x{ratio:5.2f}{marker}")
+    return regressions
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Замеры производительности инвестиционного трекера")
+    parser.add_argument('--sizes', type=int, nargs='+', default=list(DEFAULT_SIZES))
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--output', default=RESULTS_FILE)
+    parser.add_argument('--baseline', default=BASELINE_FILE)
+    parser.add_argument('--threshold', type=float, default=REGRESSION_THRESHOLD)
+    parser.add_argument('--update-baseline', action='store_true')
+    args = parser.parse_args(argv)
+
+    results = {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'storage': data.STORAGE_BACKEND,
+        'seed': args.seed,
+        'sizes': {}
+    }
+    for count in args.sizes:
+        print(f"Портфель из {count} транзакций...", file=sys.stderr)
+        results['sizes'][str(count)] = run_size(count, args.seed, args.repeat)
+    with open(args.output, 'w', encoding='utf-8') as file:
+        json.dump(results, file, ensure_ascii=False, indent=2)
+
+    if args.update_baseline:
+        with open(args.baseline, 'w', encoding='utf-8') as file:
+            json.dump(results, file, ensure_ascii=False, indent=2)
+        print(f"Эталон сохранён в {args.baseline}")
+        return 0
+    if not os.path.exists(args.baseline):
+        print(f"Эталон {args.baseline} не найден, запустите с --update-baseline")
+        return 0
+    with open(args.baseline, 'r', encoding='utf-8') as file:
+        baseline = json.load(file)
+    regressions = compare(results, baseline, args.threshold)
+    if regressions:
+        print(f"Найдено регрессий: {len(regressions)}")
+        return 1
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
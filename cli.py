@@ -0,0 +1,180 @@
+import argparse
+import csv
+import glob
+import json
+import multiprocessing
+import os
+import sys
+
+import data
+import fx
+import logic
+import sqlite_storage
+
+# Отчёты без окна: статистика, итоги по активам и выборки транзакций
+# по одному или нескольким портфелям. Файлы раздаются пулу процессов,
+# результаты печатаются в stdout по мере готовности (JSON Lines или CSV).
+#   python main.py report clients/*.json --report assets --format csv
+#   python main.py report clients/ --report transactions --asset KCEL
+#   python main.py report clients/*.db --report values
+REPORTS = ('summary', 'assets', 'transactions', 'values')
+# Отчёт values — списки активов и брокеров, как в фильтрах окна.
+VALUE_COLUMNS = ('asset', 'broker')
+FORMATS = ('json', 'csv')
+SQLITE_EXTENSIONS = ('.db', '.sqlite', '.sqlite3')
+PORTFOLIO_PATTERNS = ('*.json',) + tuple('*' + extension for extension in SQLITE_EXTENSIONS)
+REPORT_FIELDS = {
+    'summary': ('portfolio', 'base_currency', 'total', 'assets_count', 'transactions_count'),
+    'assets': ('portfolio', 'base_currency', 'asset', 'total'),
+    'transactions': ('portfolio',) + tuple(data.TRANSACTION_FIELDS),
+    'values': ('portfolio', 'column', 'value')
+}
+
+def expand_paths(paths):
+    portfolios = []
+    for path in paths:
+        if os.path.isdir(path):
+            found = set()
+            for pattern in PORTFOLIO_PATTERNS:
+                found.update(glob.glob(os.path.join(path, pattern)))
+            # Служебные файлы рядом с данными портфелями не считаются.
+            portfolios.extend(sorted(name for name in found if not name.endswith(data.STARTUP_SUFFIX)))
+        else:
+            portfolios.extend(sorted(glob.glob(path)) or [path])
+    return portfolios
+
+def open_portfolio(path):
+    data.READ_ONLY = True
+    if not os.path.isfile(path):
+        raise FileNotFoundError(f"Файл портфеля не найден: {path}")
+    if path.lower().endswith(SQLITE_EXTENSIONS):
+        # Отчёт ничего не меняет в базе: ни схемы, ни режима журнала.
+        sqlite_storage.open_readonly(path)
+        data.STORAGE_BACKEND = 'sqlite'
+        data.SQLITE_FILE = path
+    else:
+        data.STORAGE_BACKEND = 'json'
+        data.INVESTMENTS_FILE = path
+
+def build_report(path, options):
+    # Кроме строк отчёта возвращает валюты, суммы в которых не удалось
+    # пересчитать в валюту отчёта (выборка транзакций не пересчитывается).
+    try:
+        rows = _build_report(path, options)
+        unconverted = logic.get_stats()['unconverted_currencies'] if options['report'] in ('summary', 'assets') else []
+        return rows, unconverted
+    finally:
+        sqlite_storage.close(path)
+
+def _build_report(path, options):
+    open_portfolio(path)
+    base_currency = fx.get_base_currency()
+    if options['report'] == 'summary':
+        stats = logic.get_stats()
+        return [{'portfolio': path, 'base_currency': base_currency, **stats}]
+    if options['report'] == 'assets':
+        return [{'portfolio': path, 'base_currency': base_currency, 'asset': asset, 'total': total}
+                for asset, total in sorted(logic.get_asset_totals().items())]
+    if options['report'] == 'values':
+        return [{'portfolio': path, 'column': column, 'value': value}
+                for column in VALUE_COLUMNS for value in logic.query_distinct_values(column)]
+    # С SQLite выборка идёт запросом по индексам, без загрузки всего портфеля.
+    rows = logic.query_transactions(options['asset'] or 'Все активы',
+                                    options['action'] or 'Все действия',
+                                    options['broker'] or 'Все брокеры')
+    return [{'portfolio': path, **t} for t in rows]
+
+# --- Пул процессов ---
+def _init_worker(base_currency, rate_mode):
+    fx.set_base_currency(base_currency)
+    fx.set_rate_mode(rate_mode)
+
+def _run_job(job):
+    path, options = job
+    try:
+        return (path, *build_report(path, options), None)
+    except Exception as error:
+        return path, None, None, f"{type(error).__name__}: {error}"
+
+def run_reports(paths, options, workers):
+    # Порядок вывода совпадает с порядком файлов, но каждый результат
+    # отдаётся сразу, как только готовы он и все предыдущие.
+    jobs = [(path, options) for path in paths]
+    if workers <= 1 or len(paths) <= 1:
+        _init_worker(options['base_currency'], options['rate_mode'])
+        for job in jobs:
+            yield _run_job(job)
+        return
+    with multiprocessing.Pool(workers, initializer=_init_worker,
+                              initargs=(options['base_currency'], options['rate_mode'])) as pool:
+        yield from pool.imap(_run_job, jobs)
+
+# --- Вывод ---
+class JsonLinesWriter:
+    def __init__(self, stream, fields):
+        self.stream = stream
+
+    def write(self, rows):
+        for row in rows:
+            self.stream.write(json.dumps(row, ensure_ascii=False))
+            self.stream.write('\n')
+        self.stream.flush()
+
+class CsvWriter:
+    def __init__(self, stream, fields):
+        self.stream = stream
+        self.writer = csv.DictWriter(stream, fieldnames=fields, extrasaction='ignore')
+        self.writer.writeheader()
+
+    def write(self, rows):
+        self.writer.writerows(rows)
+        self.stream.flush()
+
+WRITERS = {
+    'json': JsonLinesWriter,
+    'csv': CsvWriter
+}
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='main.py report', description="Отчёты по портфелям без графического интерфейса")
+    parser.add_argument('paths', nargs='+', help="файлы портфелей (.json, .db) или папки с ними")
+    parser.add_argument('--report', choices=REPORTS, default='summary')
+    parser.add_argument('--format', choices=FORMATS, default='json')
+    parser.add_argument('--asset')
+    parser.add_argument('--action', choices=('Покупка', 'Продажа'))
+    parser.add_argument('--broker')
+    parser.add_argument('--base-currency', choices=fx.CURRENCIES, default=fx.get_base_currency())
+    parser.add_argument('--rate-mode', choices=fx.RATE_MODES, default=fx.settings['rate_mode'])
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    args = parser.parse_args(argv)
+
+    paths = expand_paths(args.paths)
+    if not paths:
+        parser.error("не найдено ни одного файла портфеля")
+    options = {
+        'report': args.report,
+        'asset': args.asset,
+        'action': args.action,
+        'broker': args.broker,
+        'base_currency': args.base_currency,
+        'rate_mode': args.rate_mode
+    }
+    writer = WRITERS[args.format](sys.stdout, REPORT_FIELDS[args.report])
+    failed = 0
+    try:
+        for path, rows, unconverted, error in run_reports(paths, options, min(args.workers, len(paths))):
+            if error is not None:
+                failed += 1
+                print(f"{path}: {error}", file=sys.stderr)
+                continue
+            if unconverted:
+                print(f"{path}: нет курса для {', '.join(unconverted)} — суммы в этих валютах "
+                      f"не пересчитаны в {options['base_currency']}", file=sys.stderr)
+            writer.write(rows)
+    except BrokenPipeError:
+        # Читатель закрыл вывод (например, `| head`): остаток не нужен.
+        os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+    return 1 if failed else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,133 @@
+import numpy as np
+
+BUY_ACTION = 'Покупка'
+
+NUMERIC_FIELDS = ('quantity', 'price_per_share', 'total_cost')
+CODED_FIELDS = ('asset', 'broker', 'action', 'currency', 'exchange')
+
+class Dictionary:
+    def __init__(self):
+        self.values = []
+        self.codes = {}
+
+    def encode(self, value):
+        code = self.codes.get(value)
+        if code is None:
+            code = self.codes[value] = len(self.values)
+            self.values.append(value)
+        return code
+
+    def lookup(self, value):
+        return self.codes.get(value, -1)
+
+def parse_date(value):
+    try:
+        return np.datetime64(value, 'D')
+    except (TypeError, ValueError):
+        return np.datetime64('NaT', 'D')
+
+def parse_dates(values):
+    try:
+        return np.array(values, dtype='datetime64[D]')
+    except (TypeError, ValueError):
+        return np.array([parse_date(value) for value in values], dtype='datetime64[D]')
+
+# Колоночное представление транзакций: числовые поля в массивах float64,
+# строковые поля закодированы целыми кодами словаря, даты — datetime64.
+# Порядок строк совпадает со списком транзакций в кэше data.py.
+class TransactionTable:
+    def __init__(self, capacity=16):
+        self.size = 0
+        self.dictionaries = {field: Dictionary() for field in CODED_FIELDS}
+        self.columns = {field: np.zeros(capacity, dtype=np.float64) for field in NUMERIC_FIELDS}
+        self.columns.update({field: np.zeros(capacity, dtype=np.int32) for field in CODED_FIELDS})
+        self.columns['date'] = np.full(capacity, np.datetime64('NaT', 'D'), dtype='datetime64[D]')
+
+    @classmethod
+    def from_transactions(cls, transactions):
+        table = cls(capacity=max(16, len(transactions)))
+        count = len(transactions)
+        for field in NUMERIC_FIELDS:
+            table.columns[field][:count] = np.fromiter(
+                (t[field] for t in transactions), dtype=np.float64, count=count)
+        for field in CODED_FIELDS:
+            encode = table.dictionaries[field].encode
+            table.columns[field][:count] = np.fromiter(
+                (encode(t[field]) for t in transactions), dtype=np.int32, count=count)
+        table.columns['date'][:count] = parse_dates([t['date'] for t in transactions])
+        table.size = count
+        return table
+
+    def __len__(self):
+        return self.size
+
+    def column(self, field):
+        return self.columns[field][:self.size]
+
+    def _grow(self):
+        for field, values in self.columns.items():
+            grown = np.empty(len(values) * 2, dtype=values.dtype)
+            grown[:self.size] = values[:self.size]
+            self.columns[field] = grown
+
+    def _write_row(self, position, t):
+        for field in NUMERIC_FIELDS:
+            self.columns[field][position] = t[field]
+        for field in CODED_FIELDS:
+            self.columns[field][position] = self.dictionaries[field].encode(t[field])
+        self.columns['date'][position] = parse_date(t['date'])
+
+    def append(self, t):
+        if self.size == len(self.columns['date']):
+            self._grow()
+        self._write_row(self.size, t)
+        self.size += 1
+
+    def set_row(self, position, t):
+        self._write_row(position, t)
+
+    def delete_row(self, position):
+        for values in self.columns.values():
+            values[position:self.size - 1] = values[position + 1:self.size]
+        self.size -= 1
+
+    def signed_costs(self):
+        buy = self.column('action') == self.dictionaries['action'].lookup(BUY_ACTION)
+        cost = self.column('total_cost')
+        return np.where(buy, cost, -cost)
+
+    def counts(self, field):
+        return np.bincount(self.column(field), minlength=len(self.dictionaries[field].values))
+
+    def group_sum(self, field, weights):
+        return np.bincount(self.column(field), weights=weights,
+                           minlength=len(self.dictionaries[field].values))
+
+    def present_values(self, field):
+        values = self.dictionaries[field].values
+        return {values[code]: int(count) for code, count in enumerate(self.counts(field)) if count}
+
+    def asset_totals(self, costs=None):
+        counts = self.counts('asset')
+        sums = self.group_sum('asset', self.signed_costs() if costs is None else costs)
+        values = self.dictionaries['asset'].values
+        return {values[code]: float(sums[code]) for code in np.flatnonzero(counts)}
+
+    def latest_values(self, key_field, value_field):
+        # Для каждого значения key_field — value_field из последней строки с ним.
+        keys = self.column(key_field)[::-1]
+        codes, positions = np.unique(keys, return_index=True)
+        found = self.column(value_field)[::-1][positions]
+        key_values = self.dictionaries[key_field].values
+        values = self.dictionaries[value_field].values
+        return {key_values[code]: values[value] for code, value in zip(codes, found)}
+
+    def mask(self, **filters):
+        mask = np.ones(self.size, dtype=bool)
+        for field, value in filters.items():
+            if value is not None:
+                mask &= self.column(field) == self.dictionaries[field].lookup(value)
+        return mask
+
+    def matching_rows(self, **filters):
+        return np.flatnonzero(self.mask(**filters)).tolist()
@@ -1,18 +1,371 @@
 import json
-from datetime import datetime
+import os
+import threading
+from datetime import date, datetime, timedelta
+
+import profiling
+import sqlite_storage
 
 INVESTMENTS_FILE = 'investments.json'
 
-def load_transactions():
+# Хранилище: 'json' (файл + журнал) или 'sqlite' (индексированная база).
+STORAGE_BACKEND = os.environ.get('FORTUNEST_STORAGE', 'json')
+SQLITE_FILE = 'investments.db'
+# Только чтение (отчёты cli.py): файлы данных не меняются, даже если
+# в журнале недописана последняя строка.
+READ_ONLY = False
+
+TRANSACTION_FIELDS = sqlite_storage.COLUMNS
+
+# Журнал изменений лежит рядом с основным файлом. Каждое добавление,
+# изменение или удаление дописывается в него одной JSON-строкой, а при
+# превышении порога журнал в фоне сворачивается в новый снимок.
+JOURNAL_SUFFIX = '.journal'
+COMPACTING_SUFFIX = '.journal.compacting'
+JOURNAL_COMPACT_THRESHOLD = 1024 * 1024
+
+# Снимок для быстрого запуска: итоги и списки фильтров на момент последнего
+# пересчёта вместе с отпечатком файлов данных. Окно заполняется им сразу,
+# а полный пересчёт идёт в фоне.
+STARTUP_SUFFIX = '.startup.json'
+
+# Общий для всего процесса кэш транзакций: файлы разбираются один раз
+# и перечитываются только при изменении их mtime или размера.
+_cache = {
+    'fingerprint': None,
+    'transactions': [],
+    'index': {}
+}
+_lock = threading.RLock()
+# Подписчики получают (event, index, old, new) при каждом изменении кэша:
+# 'add', 'update', 'delete' для отдельных строк и 'reload' при полной перезагрузке.
+_listeners = []
+_compaction = {
+    'running': False,
+    'generation': 0
+}
+
+def subscribe(listener):
+    _listeners.append(listener)
+
+def unsubscribe(listener):
+    _listeners.remove(listener)
+
+def _notify(event, index=None, old=None, new=None):
+    for listener in list(_listeners):
+        listener(event, index, old, new)
+
+def _journal_path():
+    return INVESTMENTS_FILE + JOURNAL_SUFFIX
+
+def _compacting_path():
+    return INVESTMENTS_FILE + COMPACTING_SUFFIX
+
+def _stat(path):
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return (stat.st_mtime_ns, stat.st_size)
+
+def _file_fingerprint():
+    if STORAGE_BACKEND == 'sqlite':
+        stats = (_stat(SQLITE_FILE), _stat(SQLITE_FILE + '-wal'))
+        if stats[0] is None:
+            return None
+        return (os.path.abspath(SQLITE_FILE),) + stats
+    stats = (_stat(INVESTMENTS_FILE), _stat(_compacting_path()), _stat(_journal_path()))
+    if stats == (None, None, None):
+        return None
+    return (os.path.abspath(INVESTMENTS_FILE),) + stats
+
+def _rebuild_index(transactions, index, start=0):
+    if start == 0:
+        index.clear()
+    for position in range(start, len(transactions)):
+        index[transactions[position]['id']] = position
+
+def _apply_record(transactions, index, record):
+    # Повторное применение записи безопасно: добавление существующей
+    # транзакции заменяет её, удаление отсутствующей ничего не делает.
+    # Это позволяет переиграть журнал поверх уже свёрнутого снимка.
+    op = record['op']
+    if op in ('add', 'update'):
+        transaction = record['transaction']
+        position = index.get(transaction['id'])
+        if position is None:
+            index[transaction['id']] = len(transactions)
+            transactions.append(transaction)
+        else:
+            transactions[position] = transaction
+    elif op == 'delete':
+        position = index.pop(record['id'], None)
+        if position is not None:
+            del transactions[position]
+            _rebuild_index(transactions, index, position)
+
+def _replay_journal(path, transactions, index):
+    try:
+        with open(path, 'rb') as file:
+            content = file.read()
+    except FileNotFoundError:
+        return
+    profiling.count('bytes_read', len(content))
+    # Недописанная последняя строка означает сбой во время записи:
+    # отбрасываем её, чтобы следующие записи начинались с новой строки.
+    # При чтении без права записи строка просто пропускается: её, возможно,
+    # прямо сейчас дописывает приложение.
+    end = content.rfind(b'\n') + 1
+    if end < len(content) and not READ_ONLY:
+        os.truncate(path, end)
+    for line in content[:end].splitlines():
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError:
+            continue
+        _apply_record(transactions, index, record)
+
+def _read_json_storage():
     try:
         with open(INVESTMENTS_FILE, 'r', encoding='utf-8') as file:
-            return json.load(file)
+            profiling.count('bytes_read', os.fstat(file.fileno()).st_size)
+            transactions = json.load(file)
     except FileNotFoundError:
-        return []
+        transactions = []
+    index = {}
+    _rebuild_index(transactions, index)
+    _replay_journal(_compacting_path(), transactions, index)
+    _replay_journal(_journal_path(), transactions, index)
+    return transactions, index
 
-def save_transactions(transactions):
-    with open(INVESTMENTS_FILE, 'w', encoding='utf-8') as file:
+def invalidate_cache():
+    with _lock:
+        _cache['fingerprint'] = None
+        _cache['transactions'] = []
+        _cache['index'] = {}
+        _notify('reload')
+
+@profiling.timed()
+def load_transactions():
+    with _lock:
+        fingerprint = _file_fingerprint()
+        if fingerprint is None:
+            if _cache['fingerprint'] is not None or _cache['transactions']:
+                invalidate_cache()
+            return _cache['transactions']
+        if fingerprint != _cache['fingerprint']:
+            profiling.count('parses')
+            if STORAGE_BACKEND == 'sqlite':
+                transactions = sqlite_storage.load_all(SQLITE_FILE)
+                index = {}
+                _rebuild_index(transactions, index)
+            else:
+                transactions, index = _read_json_storage()
+            _cache['transactions'] = transactions
+            _cache['index'] = index
+            _cache['fingerprint'] = _file_fingerprint()
+            _notify('reload')
+        return _cache['transactions']
+
+@profiling.timed()
+def get_transaction(transaction_id):
+    with _lock:
+        load_transactions()
+        position = _cache['index'].get(transaction_id)
+        if position is None:
+            return None
+        return _cache['transactions'][position]
+
+def _write_snapshot(transactions):
+    temp_path = INVESTMENTS_FILE + '.tmp'
+    with open(temp_path, 'w', encoding='utf-8') as file:
         json.dump(transactions, file, ensure_ascii=False, indent=2)
+        file.flush()
+        os.fsync(file.fileno())
+        profiling.count('bytes_written', os.fstat(file.fileno()).st_size)
+    os.replace(temp_path, INVESTMENTS_FILE)
+
+def _remove(path):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+@profiling.timed()
+def save_transactions(transactions):
+    with _lock:
+        if STORAGE_BACKEND == 'sqlite':
+            sqlite_storage.replace_all(SQLITE_FILE, transactions)
+        else:
+            _compaction['generation'] += 1
+            _write_snapshot(transactions)
+            _remove(_compacting_path())
+            _remove(_journal_path())
+        _cache['transactions'] = transactions
+        _rebuild_index(transactions, _cache['index'])
+        _cache['fingerprint'] = _file_fingerprint()
+        _notify('reload')
+
+def _append_record(record):
+    load_transactions()
+    if STORAGE_BACKEND == 'sqlite':
+        sqlite_storage.apply_record(SQLITE_FILE, record)
+    else:
+        line = json.dumps(record, ensure_ascii=False) + '\n'
+        with open(_journal_path(), 'a', encoding='utf-8') as file:
+            file.write(line)
+            file.flush()
+            os.fsync(file.fileno())
+        profiling.count('bytes_written', len(line.encode('utf-8')))
+    transactions = _cache['transactions']
+    index = _cache['index']
+    transaction_id = record['id'] if record['op'] == 'delete' else record['transaction']['id']
+    position = index.get(transaction_id)
+    old = transactions[position] if position is not None else None
+    _apply_record(transactions, index, record)
+    _cache['fingerprint'] = _file_fingerprint()
+    if record['op'] == 'delete':
+        if old is not None:
+            _notify('delete', position, old, None)
+    elif old is not None:
+        _notify('update', position, old, record['transaction'])
+    else:
+        _notify('add', len(transactions) - 1, None, record['transaction'])
+    if STORAGE_BACKEND != 'sqlite':
+        _maybe_compact()
+
+@profiling.timed()
+def add_transaction(transaction):
+    with _lock:
+        _append_record({'op': 'add', 'transaction': transaction})
+
+@profiling.timed()
+def update_transaction(transaction):
+    with _lock:
+        if get_transaction(transaction['id']) is None:
+            raise KeyError(transaction['id'])
+        _append_record({'op': 'update', 'transaction': transaction})
+
+@profiling.timed()
+def delete_transaction(transaction_id):
+    with _lock:
+        if get_transaction(transaction_id) is None:
+            raise KeyError(transaction_id)
+        _append_record({'op': 'delete', 'id': transaction_id})
+
+def _maybe_compact():
+    size = _stat(_journal_path())
+    if size is None or size[1] < JOURNAL_COMPACT_THRESHOLD or _compaction['running']:
+        return
+    _compaction['running'] = True
+    threading.Thread(target=compact_journal, daemon=True).start()
+
+@profiling.timed()
+def compact_journal():
+    try:
+        with _lock:
+            if _stat(_journal_path()) is None:
+                return
+            generation = _compaction['generation']
+            transactions = list(load_transactions())
+            # Новые записи пойдут в свежий журнал, пока снимок пишется без блокировки.
+            if _stat(_compacting_path()) is None:
+                os.replace(_journal_path(), _compacting_path())
+            _cache['fingerprint'] = _file_fingerprint()
+        temp_path = INVESTMENTS_FILE + '.compact.tmp'
+        with open(temp_path, 'w', encoding='utf-8') as file:
+            json.dump(transactions, file, ensure_ascii=False, indent=2)
+            file.flush()
+            os.fsync(file.fileno())
+            profiling.count('bytes_written', os.fstat(file.fileno()).st_size)
+        with _lock:
+            if generation != _compaction['generation']:
+                _remove(temp_path)
+                return
+            synced = _cache['fingerprint'] == _file_fingerprint()
+            os.replace(temp_path, INVESTMENTS_FILE)
+            _remove(_compacting_path())
+            if synced:
+                _cache['fingerprint'] = _file_fingerprint()
+    finally:
+        _compaction['running'] = False
+
+# Запросы прямо к базе, минуя кэш: для разовых выборок, когда загружать
+# весь портфель в память незачем.
+def supports_query_pushdown():
+    return STORAGE_BACKEND == 'sqlite'
+
+@profiling.timed()
+def query_transactions(asset=None, action=None, broker=None):
+    return sqlite_storage.query(SQLITE_FILE, asset=asset, action=action, broker=broker)
+
+@profiling.timed()
+def distinct_values(column):
+    return sqlite_storage.distinct_values(SQLITE_FILE, column)
+
+# --- Снимок для быстрого запуска ---
+def _startup_path():
+    return (SQLITE_FILE if STORAGE_BACKEND == 'sqlite' else INVESTMENTS_FILE) + STARTUP_SUFFIX
+
+def _snapshot_fingerprint():
+    # Кортежи отпечатка превращаются в списки, как после чтения из JSON.
+    if STORAGE_BACKEND == 'sqlite':
+        if not os.path.exists(SQLITE_FILE):
+            return None
+        return [os.path.abspath(SQLITE_FILE), sqlite_storage.revision(SQLITE_FILE)]
+    return json.loads(json.dumps(_file_fingerprint()))
+
+@profiling.timed()
+def load_startup_snapshot():
+    # Возвращает сохранённую сводку, только если данные с тех пор не менялись.
+    try:
+        with open(_startup_path(), 'r', encoding='utf-8') as file:
+            snapshot = json.load(file)
+    except (FileNotFoundError, ValueError):
+        return None
+    if not isinstance(snapshot, dict) or snapshot.get('fingerprint') != _snapshot_fingerprint():
+        return None
+    return snapshot.get('summary')
+
+def save_startup_snapshot(summary):
+    snapshot = {
+        'fingerprint': _snapshot_fingerprint(),
+        'summary': summary
+    }
+    path = _startup_path()
+    try:
+        with open(path, 'r', encoding='utf-8') as file:
+            if json.load(file) == snapshot:
+                return
+    except (FileNotFoundError, ValueError):
+        pass
+    temp_path = path + '.tmp'
+    with open(temp_path, 'w', encoding='utf-8') as file:
+        json.dump(snapshot, file, ensure_ascii=False)
+    os.replace(temp_path, path)
+
+def migrate_json_to_sqlite():
+    with _lock:
+        transactions, _ = _read_json_storage()
+        sqlite_storage.replace_all(SQLITE_FILE, transactions)
+        if STORAGE_BACKEND == 'sqlite':
+            invalidate_cache()
+        return len(transactions)
+
+# Даты сделок вне этого диапазона почти всегда опечатка в годе (1025 вместо 2025).
+MIN_TRADE_DATE = date(1900, 1, 1)
+MAX_TRADE_DAYS_AHEAD = 366
+
+def check_trade_date(value):
+    try:
+        day = datetime.strptime(value, '%Y-%m-%d').date()
+    except (TypeError, ValueError):
+        raise ValueError(f"неверная дата «{value}», ожидается ГГГГ-ММ-ДД")
+    if not MIN_TRADE_DATE <= day <= date.today() + timedelta(days=MAX_TRADE_DAYS_AHEAD):
+        raise ValueError(f"дата «{value}» вне допустимого диапазона")
+    return value
 
 def format_date(date_string):
     try:
@@ -21,4 +374,4 @@ def format_date(date_string):
         return date_string
 
 def format_currency(amount):
-    return f"{amount:,.2f}".replace(',', ' ') 
\ No newline at end of file
+    return f"{amount:,.2f}".replace(',', ' ')
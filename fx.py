@@ -0,0 +1,159 @@
+import csv
+import json
+import os
+from functools import lru_cache
+
+import numpy as np
+
+# Курсы в файле задаются как количество REFERENCE_CURRENCY за единицу
+# валюты на дату. Поддерживаются CSV с колонками date,currency,rate и
+# JSON вида {"USD": {"2024-01-02": 450.1, ...}, ...}.
+FX_RATES_FILE = 'fx_rates.csv'
+REFERENCE_CURRENCY = 'KZT'
+CURRENCIES = ['KZT', 'USD', 'EUR', 'RUB']
+RATE_MODES = ('trade', 'current')
+CACHE_SIZE = 4096
+
+settings = {
+    'base_currency': 'KZT',
+    'rate_mode': 'trade'
+}
+_state = {
+    'fingerprint': None,
+    'table': None,
+    'version': 0
+}
+
+class RateTable:
+    def __init__(self, records):
+        by_currency = {}
+        for day, currency, rate in records:
+            by_currency.setdefault(currency, {})[day] = float(rate)
+        self.dates = {}
+        self.rates = {}
+        for currency, rates in by_currency.items():
+            days = sorted(rates)
+            self.dates[currency] = np.array(days, dtype='datetime64[D]')
+            self.rates[currency] = np.array([rates[day] for day in days], dtype=np.float64)
+
+    def rate(self, currency, day=None):
+        if currency == REFERENCE_CURRENCY:
+            return 1.0
+        rates = self.rates.get(currency)
+        if rates is None:
+            return None
+        if day is None:
+            return float(rates[-1])
+        position = np.searchsorted(self.dates[currency], day, side='right') - 1
+        return float(rates[max(position, 0)])
+
+    def rates_for(self, currency, days):
+        if currency == REFERENCE_CURRENCY:
+            return np.ones(len(days))
+        rates = self.rates.get(currency)
+        if rates is None:
+            return None
+        positions = np.searchsorted(self.dates[currency], days, side='right') - 1
+        result = rates[np.clip(positions, 0, None)]
+        # Для нераспознанных дат берём последний известный курс.
+        return np.where(np.isnat(days), rates[-1], result)
+
+def _read_records(path):
+    if path.endswith('.json'):
+        with open(path, 'r', encoding='utf-8') as file:
+            content = json.load(file)
+        return [(day, currency, rate) for currency, rates in content.items() for day, rate in rates.items()]
+    with open(path, 'r', encoding='utf-8', newline='') as file:
+        return [(row['date'], row['currency'], row['rate']) for row in csv.DictReader(file)]
+
+def _invalidate():
+    _state['version'] += 1
+    _cached_factor.cache_clear()
+
+def get_rate_table():
+    try:
+        stat = os.stat(FX_RATES_FILE)
+        fingerprint = (os.path.abspath(FX_RATES_FILE), stat.st_mtime_ns, stat.st_size)
+    except FileNotFoundError:
+        fingerprint = None
+    if _state['table'] is None or fingerprint != _state['fingerprint']:
+        _state['table'] = RateTable(_read_records(FX_RATES_FILE) if fingerprint else [])
+        _state['fingerprint'] = fingerprint
+        _invalidate()
+    return _state['table']
+
+def version():
+    get_rate_table()
+    return _state['version']
+
+def get_base_currency():
+    return settings['base_currency']
+
+def set_base_currency(currency):
+    if currency != settings['base_currency']:
+        settings['base_currency'] = currency
+        _invalidate()
+
+def set_rate_mode(mode):
+    if mode not in RATE_MODES:
+        raise ValueError(f"Неизвестный режим пересчёта: {mode}")
+    if mode != settings['rate_mode']:
+        settings['rate_mode'] = mode
+        _invalidate()
+
+def _safe_day(day):
+    try:
+        return np.datetime64(day, 'D')
+    except (TypeError, ValueError):
+        return None
+
+@lru_cache(maxsize=CACHE_SIZE)
+def _cached_factor(currency, day):
+    table = _state['table']
+    base = settings['base_currency']
+    if currency == base:
+        return 1.0
+    if settings['rate_mode'] == 'current':
+        day = None
+    parsed = _safe_day(day) if day is not None else None
+    rate = table.rate(currency, parsed)
+    base_rate = table.rate(base, parsed)
+    # Без курса сумма остаётся в исходной валюте, как и раньше.
+    if rate is None or base_rate is None:
+        return 1.0
+    return rate / base_rate
+
+def factor(currency, day=None):
+    get_rate_table()
+    return _cached_factor(currency, day)
+
+def convert(amount, currency, day=None):
+    return amount * factor(currency, day)
+
+def missing_currencies(currencies):
+    # Валюты, которые нельзя пересчитать в валюту отчёта: factor() для них
+    # возвращает 1.0, и суммы остаются в исходной валюте.
+    table = get_rate_table()
+    base = settings['base_currency']
+    base_missing = table.rate(base) is None
+    return sorted(currency for currency in currencies
+                  if currency != base and (base_missing or table.rate(currency) is None))
+
+def factors_for(currency_codes, currency_values, days):
+    table = get_rate_table()
+    base = settings['base_currency']
+    if settings['rate_mode'] == 'current':
+        days = np.full(len(days), np.datetime64('NaT', 'D'))
+    base_rates = table.rates_for(base, days)
+    result = np.ones(len(days))
+    for code, currency in enumerate(currency_values):
+        if currency == base:
+            continue
+        mask = currency_codes == code
+        if not mask.any():
+            continue
+        rates = table.rates_for(currency, days[mask])
+        if rates is None or base_rates is None:
+            continue
+        result[mask] = rates / base_rates[mask]
+    return result
@@ -0,0 +1,245 @@
+import csv
+import os
+import uuid
+from datetime import date, datetime
+from itertools import islice
+
+from data import load_transactions, save_transactions, check_trade_date, TRANSACTION_FIELDS
+
+BATCH_SIZE = 5000
+PROGRESS_EVERY = 5000
+
+# Заголовки из выписок брокеров -> поля транзакции (сравнение без учёта регистра).
+COLUMN_ALIASES = {
+    'id': 'id',
+    'date': 'date', 'дата': 'date', 'дата сделки': 'date', 'trade date': 'date',
+    'company_name': 'company_name', 'компания': 'company_name', 'название компании': 'company_name',
+    'эмитент': 'company_name', 'company': 'company_name',
+    'asset': 'asset', 'актив': 'asset', 'тикер': 'asset', 'инструмент': 'asset', 'ticker': 'asset', 'symbol': 'asset',
+    'action': 'action', 'действие': 'action', 'операция': 'action', 'тип операции': 'action', 'вид сделки': 'action',
+    'side': 'action',
+    'quantity': 'quantity', 'количество': 'quantity', 'кол-во': 'quantity', 'qty': 'quantity',
+    'price_per_share': 'price_per_share', 'цена': 'price_per_share', 'цена за акцию': 'price_per_share', 'price': 'price_per_share',
+    'total_cost': 'total_cost', 'сумма': 'total_cost', 'сумма сделки': 'total_cost', 'amount': 'total_cost', 'total': 'total_cost',
+    'currency': 'currency', 'валюта': 'currency',
+    'exchange': 'exchange', 'биржа': 'exchange', 'площадка': 'exchange',
+    'broker': 'broker', 'брокер': 'broker',
+    'settlement_date': 'settlement_date', 'дата расчета': 'settlement_date', 'дата расчёта': 'settlement_date',
+    'settlement': 'settlement_date',
+    'deal_number': 'deal_number', 'номер сделки': 'deal_number', '№ сделки': 'deal_number', 'trade id': 'deal_number'
+}
+ACTION_ALIASES = {
+    'покупка': 'Покупка', 'купля': 'Покупка', 'buy': 'Покупка', 'b': 'Покупка',
+    'продажа': 'Продажа', 'sell': 'Продажа', 's': 'Продажа'
+}
+DATE_FORMATS = ('%Y-%m-%d', '%d.%m.%Y', '%d/%m/%Y', '%Y-%m-%d %H:%M:%S', '%d.%m.%Y %H:%M:%S')
+REQUIRED_FIELDS = ('date', 'asset', 'action', 'quantity', 'price_per_share')
+
+class ImportFileError(Exception):
+    pass
+
+def _open_excel_module():
+    try:
+        import openpyxl
+    except ImportError:
+        raise ImportFileError("Для работы с Excel установите openpyxl: pip install openpyxl")
+    return openpyxl
+
+# --- Чтение ---
+def _read_csv(path, progress):
+    size = os.path.getsize(path) or 1
+    with open(path, 'r', encoding='utf-8-sig', newline='') as file:
+        sample = file.read(4096)
+        file.seek(0)
+        try:
+            dialect = csv.Sniffer().sniff(sample, delimiters=',;\t')
+        except csv.Error:
+            dialect = csv.excel
+        reader = csv.reader(file, dialect)
+        header = next(reader, None)
+        if header is None:
+            return
+        yield header
+        for line_number, row in enumerate(reader, start=2):
+            yield line_number, row
+            if progress and line_number % PROGRESS_EVERY == 0:
+                progress(line_number - 1, file.buffer.tell() / size)
+
+def _read_xlsx(path, progress):
+    openpyxl = _open_excel_module()
+    workbook = openpyxl.load_workbook(path, read_only=True, data_only=True)
+    try:
+        sheet = workbook.active
+        rows = sheet.iter_rows(values_only=True)
+        header = next(rows, None)
+        if header is None:
+            return
+        yield ['' if cell is None else str(cell) for cell in header]
+        total = sheet.max_row or 0
+        for line_number, row in enumerate(rows, start=2):
+            yield line_number, row
+            if progress and line_number % PROGRESS_EVERY == 0:
+                progress(line_number - 1, line_number / total if total else 0)
+    finally:
+        workbook.close()
+
+def read_rows(path, progress=None):
+    if path.lower().endswith(('.xlsx', '.xlsm')):
+        rows = _read_xlsx(path, progress)
+    else:
+        rows = _read_csv(path, progress)
+    header = next(rows, None)
+    if header is None:
+        return
+    mapping = map_columns(header)
+    for line_number, row in rows:
+        yield line_number, {field: row[position] for position, field in mapping.items() if position < len(row)}
+
+def map_columns(header):
+    mapping = {}
+    for position, name in enumerate(header):
+        field = COLUMN_ALIASES.get(str(name).strip().lower())
+        if field and field not in mapping.values():
+            mapping[position] = field
+    missing = [field for field in REQUIRED_FIELDS if field not in mapping.values()]
+    if missing:
+        raise ImportFileError(f"В файле нет обязательных колонок: {', '.join(missing)}")
+    return mapping
+
+def batched(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        batch = list(islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+# --- Проверка и приведение типов ---
+def _to_number(value):
+    if isinstance(value, (int, float)):
+        return value
+    text = str(value).replace('\xa0', '').replace(' ', '').replace(',', '.')
+    number = float(text)
+    return int(number) if number.is_integer() else number
+
+def _to_date(value):
+    if isinstance(value, datetime):
+        return value.strftime('%Y-%m-%d')
+    if isinstance(value, date):
+        return value.isoformat()
+    text = str(value).strip()
+    for date_format in DATE_FORMATS:
+        try:
+            return datetime.strptime(text, date_format).strftime('%Y-%m-%d')
+        except ValueError:
+            pass
+    raise ValueError(f"неверная дата «{text}»")
+
+def _to_text(value):
+    if value is None:
+        return ''
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    return str(value).strip()
+
+def coerce_transaction(raw, defaults):
+    for field in REQUIRED_FIELDS:
+        if raw.get(field) in (None, ''):
+            raise ValueError(f"пустое поле {field}")
+    action = ACTION_ALIASES.get(_to_text(raw['action']).lower())
+    if action is None:
+        raise ValueError(f"неизвестное действие «{raw['action']}»")
+    quantity = _to_number(raw['quantity'])
+    price = _to_number(raw['price_per_share'])
+    total_cost = raw.get('total_cost')
+    settlement = raw.get('settlement_date')
+    transaction = {
+        'id': _to_text(raw.get('id')) or str(uuid.uuid4()),
+        'date': check_trade_date(_to_date(raw['date'])),
+        'company_name': _to_text(raw.get('company_name')),
+        'asset': _to_text(raw['asset']),
+        'action': action,
+        'quantity': quantity,
+        'price_per_share': price,
+        'total_cost': abs(_to_number(total_cost)) if total_cost not in (None, '') else quantity * price,
+        'currency': _to_text(raw.get('currency')).upper() or defaults.get('currency', 'KZT'),
+        'exchange': _to_text(raw.get('exchange')) or defaults.get('exchange', ''),
+        'broker': _to_text(raw.get('broker')) or defaults.get('broker', ''),
+        'settlement_date': _to_date(settlement) if settlement not in (None, '') else '',
+        'deal_number': _to_text(raw.get('deal_number'))
+    }
+    return transaction
+
+def validate_batch(batch, defaults):
+    valid = []
+    errors = []
+    for line_number, raw in batch:
+        try:
+            valid.append(coerce_transaction(raw, defaults))
+        except (ValueError, TypeError) as error:
+            errors.append((line_number, str(error)))
+    return valid, errors
+
+def import_file(path, defaults=None, progress=None, batch_size=BATCH_SIZE):
+    defaults = defaults or {}
+    existing = load_transactions()
+    deal_numbers = set(t.get('deal_number') for t in existing if t.get('deal_number'))
+    ids = set(t['id'] for t in existing)
+    added = []
+    duplicates = 0
+    errors = []
+    processed = 0
+    for batch in batched(read_rows(path, progress), batch_size):
+        valid, batch_errors = validate_batch(batch, defaults)
+        errors.extend(batch_errors)
+        processed += len(batch)
+        for transaction in valid:
+            deal_number = transaction['deal_number']
+            if deal_number and deal_number in deal_numbers:
+                duplicates += 1
+                continue
+            if deal_number:
+                deal_numbers.add(deal_number)
+            if transaction['id'] in ids:
+                transaction['id'] = str(uuid.uuid4())
+            ids.add(transaction['id'])
+            added.append(transaction)
+    if added:
+        save_transactions(existing + added)
+    if progress:
+        progress(processed, 1.0)
+    return {
+        'processed': processed,
+        'added': len(added),
+        'duplicates': duplicates,
+        'errors': errors
+    }
+
+# --- Выгрузка ---
+def _export_rows(transactions, progress):
+    total = len(transactions) or 1
+    for count, t in enumerate(transactions, start=1):
+        yield [t.get(field, '') for field in TRANSACTION_FIELDS]
+        if progress and count % PROGRESS_EVERY == 0:
+            progress(count, count / total)
+
+def export_file(path, transactions=None, progress=None):
+    if transactions is None:
+        transactions = load_transactions()
+    rows = _export_rows(transactions, progress)
+    if path.lower().endswith('.xlsx'):
+        openpyxl = _open_excel_module()
+        workbook = openpyxl.Workbook(write_only=True)
+        sheet = workbook.create_sheet('Транзакции')
+        sheet.append(list(TRANSACTION_FIELDS))
+        for row in rows:
+            sheet.append(row)
+        workbook.save(path)
+    else:
+        with open(path, 'w', encoding='utf-8-sig', newline='') as file:
+            writer = csv.writer(file)
+            writer.writerow(TRANSACTION_FIELDS)
+            writer.writerows(rows)
+    if progress:
+        progress(len(transactions), 1.0)
+    return len(transactions)
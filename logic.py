@@ -1,11 +1,25 @@
-import matplotlib.pyplot as plt
-from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
-import tkinter as tk
-from data import load_transactions, format_date, format_currency
+import math
+from datetime import date
+from data import load_transactions, subscribe, format_date, format_currency
+import data
+from columnar import TransactionTable
+from timeseries import get_timeline
+import fx
+import profiling
 
-def get_stats():
-    transactions = load_transactions()
-    total = sum(t['total_cost'] if t['action'] == 'Покупка' else -t['total_cost'] for t in transactions)
+def signed_cost(t):
+    return t['total_cost'] if t['action'] == 'Покупка' else -t['total_cost']
+
+# Сумма со знаком в базовой валюте отчёта (см. fx.py).
+def base_cost(t):
+    return signed_cost(t) * fx.factor(t['currency'], t['date'])
+
+def base_costs(table):
+    return table.signed_costs() * fx.factors_for(
+        table.column('currency'), table.dictionaries['currency'].values, table.column('date'))
+
+def compute_stats(transactions):
+    total = sum(base_cost(t) for t in transactions)
     assets = set(t['asset'] for t in transactions)
     return {
         'total': total,
@@ -13,42 +27,352 @@ def get_stats():
         'transactions_count': len(transactions)
     }
 
-def get_asset_totals():
-    transactions = load_transactions()
+def compute_asset_totals(transactions):
     asset_totals = {}
     for t in transactions:
         asset = t['asset']
-        total_cost = t['total_cost'] if t['action'] == 'Покупка' else -t['total_cost']
-        asset_totals[asset] = asset_totals.get(asset, 0) + total_cost
+        asset_totals[asset] = asset_totals.get(asset, 0) + base_cost(t)
     return asset_totals
 
+# --- Колоночная таблица ---
+# Строится из кэша один раз и дальше обновляется вместе с ним построчно.
+_table_state = {'table': None}
+
+def _on_table_change(event, index, old, new):
+    table = _table_state['table']
+    if table is None:
+        return
+    if event == 'reload':
+        _table_state['table'] = None
+    elif event == 'add':
+        table.append(new)
+    elif event == 'update':
+        table.set_row(index, new)
+    elif event == 'delete':
+        table.delete_row(index)
+
+subscribe(_on_table_change)
+
+@profiling.timed()
+def get_table():
+    transactions = load_transactions()
+    table = _table_state['table']
+    if table is None or len(table) != len(transactions):
+        table = _table_state['table'] = TransactionTable.from_transactions(transactions)
+    return table
+
+# --- Агрегаты портфеля ---
+# Итоги поддерживаются приращениями: при добавлении транзакция учитывается,
+# при удалении вычитается, при изменении старая версия вычитается и
+# учитывается новая. Полный пересчёт нужен только после перезагрузки файла.
+class PortfolioAggregates:
+    def __init__(self):
+        self.dirty = True
+        self.fx_version = None
+        self.reset()
+
+    def reset(self):
+        self.total = 0
+        self.asset_totals = {}
+        self.asset_counts = {}
+        self.broker_counts = {}
+        self.currency_counts = {}
+        self.transactions_count = 0
+
+    def _apply(self, t, sign):
+        cost = base_cost(t) * sign
+        asset = t['asset']
+        self.total += cost
+        self.asset_totals[asset] = self.asset_totals.get(asset, 0) + cost
+        self.transactions_count += sign
+        if self._count(self.asset_counts, asset, sign) == 0:
+            del self.asset_totals[asset]
+        self._count(self.broker_counts, t['broker'], sign)
+        self._count(self.currency_counts, t['currency'], sign)
+
+    def _count(self, counts, key, sign):
+        count = counts.get(key, 0) + sign
+        if count:
+            counts[key] = count
+        else:
+            del counts[key]
+        return count
+
+    def on_change(self, event, index, old, new):
+        if event == 'reload':
+            self.dirty = True
+            return
+        if self.dirty:
+            return
+        if old is not None:
+            self._apply(old, -1)
+        if new is not None:
+            self._apply(new, 1)
+
+    @profiling.timed()
+    def rebuild(self, table):
+        self.fx_version = fx.version()
+        costs = base_costs(table)
+        self.total = float(costs.sum())
+        self.asset_totals = table.asset_totals(costs)
+        self.asset_counts = table.present_values('asset')
+        self.broker_counts = table.present_values('broker')
+        self.currency_counts = table.present_values('currency')
+        self.transactions_count = len(table)
+        self.dirty = False
+
+    def check(self, transactions):
+        stats = compute_stats(transactions)
+        asset_totals = compute_asset_totals(transactions)
+        return (
+            math.isclose(self.total, stats['total'], abs_tol=1e-6)
+            and len(self.asset_counts) == stats['assets_count']
+            and self.transactions_count == stats['transactions_count']
+            and set(self.asset_totals) == set(asset_totals)
+            and all(math.isclose(self.asset_totals[a], v, abs_tol=1e-6) for a, v in asset_totals.items())
+            and set(self.broker_counts) == set(t['broker'] for t in transactions)
+        )
+
+aggregates = PortfolioAggregates()
+subscribe(aggregates.on_change)
+
+def get_aggregates():
+    load_transactions()
+    if aggregates.dirty or aggregates.fx_version != fx.version():
+        aggregates.rebuild(get_table())
+    return aggregates
+
+@profiling.timed()
+def verify_aggregates():
+    # Сверяются актуальные итоги: после перезагрузки или смены курсов
+    # get_aggregates() сначала их пересчитывает.
+    get_aggregates()
+    transactions = load_transactions()
+    if aggregates.check(transactions):
+        return True
+    _table_state['table'] = None
+    aggregates.rebuild(get_table())
+    return False
+
+@profiling.timed()
+def get_stats():
+    current = get_aggregates()
+    return {
+        'total': current.total,
+        'assets_count': len(current.asset_counts),
+        'transactions_count': current.transactions_count,
+        # Валюты без курса: их суммы вошли в итог без пересчёта.
+        'unconverted_currencies': fx.missing_currencies(current.currency_counts)
+    }
+
+@profiling.timed()
+def get_asset_totals():
+    return dict(get_aggregates().asset_totals)
+
+@profiling.timed()
+def get_distinct_values(column):
+    current = get_aggregates()
+    counts = current.asset_counts if column == 'asset' else current.broker_counts
+    return sorted(counts)
+
+# Биржа актива — по его последней сделке (для котировок, см. quotes.py).
+@profiling.timed()
+def get_asset_exchanges():
+    return get_table().latest_values('asset', 'exchange')
+
+def _filters(asset_filter, action_filter, broker_filter):
+    return {
+        'asset': None if asset_filter == 'Все активы' else asset_filter,
+        'action': None if action_filter == 'Все действия' else action_filter,
+        'broker': None if broker_filter == 'Все брокеры' else broker_filter
+    }
+
+@profiling.timed()
 def filter_transactions(asset_filter, action_filter, broker_filter):
+    filters = _filters(asset_filter, action_filter, broker_filter)
+    # Оба хранилища держат строки в кэше data.py, поэтому фильтр — маска
+    # колоночной таблицы, а не новый запрос к файлу или базе.
     transactions = load_transactions()
-    filtered = transactions
-    if asset_filter != 'Все активы':
-        filtered = [t for t in filtered if t['asset'] == asset_filter]
-    if action_filter != 'Все действия':
-        filtered = [t for t in filtered if t['action'] == action_filter]
-    if broker_filter != 'Все брокеры':
-        filtered = [t for t in filtered if t['broker'] == broker_filter]
-    return filtered
-
-def plot_pie_chart(chart_frame):
-    asset_totals = get_asset_totals()
-    labels = []
-    sizes = []
-    total_sum = sum(asset_totals.values())
-    for asset, total in asset_totals.items():
-        percentage = (total / total_sum * 100) if total_sum > 0 else 0
-        labels.append(f"{asset} ({percentage:.1f}%)")
-        sizes.append(total)
-    chart_frame_inner = tk.Frame(chart_frame)
-    chart_frame_inner.pack(fill=tk.BOTH, expand=True)
-    for widget in chart_frame_inner.winfo_children():
-        widget.destroy()
-    fig, ax = plt.subplots()
-    ax.pie(sizes, labels=labels, autopct='%1.1f%%', startangle=90)
-    ax.axis('equal')
-    canvas = FigureCanvasTkAgg(fig, master=chart_frame_inner)
-    canvas.draw()
-    canvas.get_tk_widget().pack(fill=tk.BOTH, expand=True) 
\ No newline at end of file
+    if all(value is None for value in filters.values()):
+        return transactions
+    return [transactions[position] for position in get_table().matching_rows(**filters)]
+
+# Разовые выборки (отчёты без окна): с SQLite это индексированные запросы
+# к базе, и портфель целиком в память не загружается. Окну выгоднее
+# кэш, который у него и так уже есть.
+@profiling.timed()
+def query_transactions(asset_filter, action_filter, broker_filter):
+    if data.supports_query_pushdown():
+        return data.query_transactions(**_filters(asset_filter, action_filter, broker_filter))
+    return filter_transactions(asset_filter, action_filter, broker_filter)
+
+@profiling.timed()
+def query_distinct_values(column):
+    if data.supports_query_pushdown():
+        return data.distinct_values(column)
+    return get_distinct_values(column)
+
+# --- Диаграмма распределения ---
+# Фигура и холст создаются один раз. Частые запросы на обновление
+# склеиваются в одну перерисовку, мелкие доли собираются в «Другие».
+CHART_MIN_SHARE = 0.02
+CHART_MAX_SLICES = 12
+CHART_OTHER_LABEL = 'Другие'
+
+def group_small_slices(asset_totals, min_share=CHART_MIN_SHARE, max_slices=CHART_MAX_SLICES):
+    positive = sorted(((asset, total) for asset, total in asset_totals.items() if total > 0),
+                      key=lambda item: item[1], reverse=True)
+    total_sum = sum(total for _, total in positive)
+    slices = []
+    other = []
+    for asset, total in positive:
+        if len(slices) < max_slices - 1 and total / total_sum >= min_share:
+            slices.append((asset, total))
+        else:
+            other.append((asset, total))
+    if len(other) == 1:
+        slices.append(other[0])
+    elif other:
+        slices.append((CHART_OTHER_LABEL, sum(total for _, total in other)))
+    return slices
+
+# matplotlib и Tk-бэкенд загружаются при первом построении графика, а не
+# при импорте модуля: окно появляется сразу, а logic можно использовать
+# без дисплея. load_chart_backend() можно вызвать заранее в фоне.
+@profiling.timed()
+def load_chart_backend():
+    from matplotlib.figure import Figure
+    from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
+    return Figure, FigureCanvasTkAgg
+
+def _create_tk_canvas(figure, master):
+    import tkinter as tk
+    _, FigureCanvasTkAgg = load_chart_backend()
+    canvas = FigureCanvasTkAgg(figure, master=master)
+    canvas.get_tk_widget().pack(fill=tk.BOTH, expand=True)
+    return canvas
+
+class AllocationChart:
+    def __init__(self, master):
+        self.master = master
+        from matplotlib.figure import Figure
+        self.figure = Figure(figsize=(5, 4))
+        self.ax = self.figure.add_subplot()
+        self.canvas = self._create_canvas()
+        self.wedges = []
+        self.texts = []
+        self.autotexts = []
+        self.pending = None
+        self.asset_totals = None
+
+    def _create_canvas(self):
+        return _create_tk_canvas(self.figure, self.master)
+
+    def refresh(self, asset_totals=None):
+        # Итоги можно передать уже посчитанными (например, из фонового потока).
+        self.asset_totals = asset_totals
+        if self.pending is None:
+            self.pending = self.master.after_idle(self._redraw)
+
+    def _redraw(self):
+        self.pending = None
+        asset_totals = self.asset_totals
+        self.update(get_asset_totals() if asset_totals is None else asset_totals)
+
+    @profiling.timed()
+    def update(self, asset_totals):
+        slices = group_small_slices(asset_totals)
+        total_sum = sum(total for _, total in slices)
+        labels = [f"{asset} ({total / total_sum * 100:.1f}%)" for asset, total in slices]
+        if slices and len(slices) == len(self.wedges):
+            self._update_wedges(slices, labels, total_sum)
+        else:
+            self.ax.clear()
+            if slices:
+                self.wedges, self.texts, self.autotexts = self.ax.pie(
+                    [total for _, total in slices], labels=labels, autopct='%1.1f%%', startangle=90)
+            else:
+                self.wedges, self.texts, self.autotexts = [], [], []
+            self.ax.axis('equal')
+        self.canvas.draw_idle()
+
+    def _update_wedges(self, slices, labels, total_sum):
+        # Тот же расчёт углов и подписей, что и в Axes.pie, но без пересоздания объектов.
+        theta = 90
+        for wedge, text, autotext, label, (_, total) in zip(self.wedges, self.texts, self.autotexts, labels, slices):
+            span = 360 * total / total_sum
+            wedge.set_theta1(theta)
+            wedge.set_theta2(theta + span)
+            middle = math.radians(theta + span / 2)
+            x, y = math.cos(middle), math.sin(middle)
+            text.set_position((1.1 * x, 1.1 * y))
+            text.set_text(label)
+            text.set_horizontalalignment('left' if x > 0 else 'right')
+            autotext.set_position((0.6 * x, 0.6 * y))
+            autotext.set_text(f"{total / total_sum * 100:.1f}%")
+            theta += span
+
+_allocation_chart = None
+
+def plot_pie_chart(chart_frame, asset_totals=None):
+    global _allocation_chart
+    if _allocation_chart is None or _allocation_chart.master is not chart_frame:
+        _allocation_chart = AllocationChart(chart_frame)
+    _allocation_chart.refresh(asset_totals)
+
+# --- Динамика портфеля ---
+DYNAMICS_FREQUENCIES = {
+    'Дни': 'D',
+    'Недели': 'W',
+    'Месяцы': 'M'
+}
+
+@profiling.timed()
+def get_portfolio_series(frequency='M'):
+    return get_timeline().series(frequency, end=date.today())
+
+class DynamicsChart:
+    def __init__(self, master):
+        self.master = master
+        self.frequency = 'M'
+        from matplotlib.figure import Figure
+        self.figure = Figure(figsize=(5, 2.5))
+        self.ax = self.figure.add_subplot()
+        self.line, = self.ax.plot([], [], color='#2563EB')
+        self.ax.grid(True, alpha=0.3)
+        self.canvas = self._create_canvas()
+        self.pending = None
+        self.series = None
+
+    def _create_canvas(self):
+        return _create_tk_canvas(self.figure, self.master)
+
+    def refresh(self, frequency=None, series=None):
+        if frequency is not None:
+            self.frequency = frequency
+        self.series = series
+        if self.pending is None:
+            self.pending = self.master.after_idle(self._redraw)
+
+    def _redraw(self):
+        self.pending = None
+        series = self.series
+        self.update(get_portfolio_series(self.frequency) if series is None else series)
+
+    @profiling.timed()
+    def update(self, series):
+        self.line.set_data([day for day, _ in series], [value for _, value in series])
+        self.ax.set_ylabel(f"Вложено, {fx.get_base_currency()}")
+        if series:
+            self.ax.relim()
+            self.ax.autoscale_view()
+            self.figure.autofmt_xdate()
+        self.canvas.draw_idle()
+
+_dynamics_chart = None
+
+def plot_dynamics_chart(frame, frequency=None, series=None):
+    global _dynamics_chart
+    if _dynamics_chart is None or _dynamics_chart.master is not frame:
+        _dynamics_chart = DynamicsChart(frame)
+    _dynamics_chart.refresh(frequency, series)
@@ -0,0 +1,222 @@
+from bisect import bisect_left
+from collections import deque
+
+from data import load_transactions, subscribe
+import fx
+import profiling
+
+BUY_ACTION = 'Покупка'
+# 'fifo' — продажа закрывает самые ранние лоты, 'average' — списывает
+# бумаги по средней цене всей позиции.
+LOT_METHODS = ('fifo', 'average')
+# Каждые CHECKPOINT_EVERY сделок актива запоминается состояние, чтобы
+# правка старой сделки пересчитывала только хвост истории этого актива.
+CHECKPOINT_EVERY = 256
+EPSILON = 1e-9
+
+# Состояние позиции по одному активу. Суммы — в валюте отчёта (fx.py).
+class LotState:
+    __slots__ = ('lots', 'quantity', 'cost', 'realized', 'unmatched')
+
+    def __init__(self):
+        self.lots = deque()
+        self.quantity = 0.0
+        self.cost = 0.0
+        self.realized = 0.0
+        self.unmatched = 0.0
+
+    def copy(self):
+        state = LotState()
+        state.lots = deque(self.lots)
+        state.quantity = self.quantity
+        state.cost = self.cost
+        state.realized = self.realized
+        state.unmatched = self.unmatched
+        return state
+
+    def apply(self, trade, method):
+        is_buy, quantity, amount = trade
+        if quantity <= 0:
+            return
+        if is_buy:
+            self.lots.append((quantity, amount / quantity))
+            self.quantity += quantity
+            self.cost += amount
+            return
+        if method == 'fifo':
+            matched_cost = self._take_fifo(quantity)
+        else:
+            matched_cost = self.cost * min(quantity, self.quantity) / self.quantity if self.quantity > EPSILON else 0.0
+        matched = min(quantity, self.quantity)
+        # Продажа сверх открытой позиции (например, бумаги пришли переводом)
+        # учитывается отдельно и в прибыль не попадает.
+        self.unmatched += quantity - matched
+        self.realized += amount * matched / quantity - matched_cost
+        self.quantity -= matched
+        self.cost -= matched_cost
+        if self.quantity <= EPSILON:
+            self.quantity = 0.0
+            self.cost = 0.0
+            self.lots.clear()
+
+    def _take_fifo(self, quantity):
+        remaining = quantity
+        cost = 0.0
+        lots = self.lots
+        while remaining > EPSILON and lots:
+            lot_quantity, unit_cost = lots[0]
+            taken = min(lot_quantity, remaining)
+            cost += taken * unit_cost
+            remaining -= taken
+            if lot_quantity - taken > EPSILON:
+                lots[0] = (lot_quantity - taken, unit_cost)
+            else:
+                lots.popleft()
+        return cost
+
+# Сделки одного актива в порядке (дата, порядковый номер) и контрольные
+# точки: checkpoints[i] — состояние перед сделкой i * CHECKPOINT_EVERY.
+class AssetLedger:
+    def __init__(self, method):
+        self.method = method
+        self.keys = []
+        self.trades = []
+        self.checkpoints = [LotState()]
+        self.state = LotState()
+
+    def __len__(self):
+        return len(self.keys)
+
+    def insert(self, key, trade):
+        position = bisect_left(self.keys, key)
+        if position == len(self.keys):
+            self._append(key, trade)
+            return
+        self.keys.insert(position, key)
+        self.trades.insert(position, trade)
+        self._replay(position)
+
+    def remove(self, key):
+        position = bisect_left(self.keys, key)
+        if position == len(self.keys) or self.keys[position] != key:
+            return
+        del self.keys[position]
+        del self.trades[position]
+        self._replay(position)
+
+    def _append(self, key, trade):
+        count = len(self.keys)
+        if count % CHECKPOINT_EVERY == 0 and len(self.checkpoints) == count // CHECKPOINT_EVERY:
+            self.checkpoints.append(self.state.copy())
+        self.keys.append(key)
+        self.trades.append(trade)
+        self.state.apply(trade, self.method)
+
+    def _replay(self, position):
+        # Контрольные точки до места правки остаются верными, дальше
+        # история проигрывается заново с ближайшей из них.
+        keep = position // CHECKPOINT_EVERY + 1
+        del self.checkpoints[keep:]
+        state = self.checkpoints[-1].copy()
+        for index in range((keep - 1) * CHECKPOINT_EVERY, len(self.trades)):
+            if index % CHECKPOINT_EVERY == 0 and index // CHECKPOINT_EVERY == len(self.checkpoints):
+                self.checkpoints.append(state.copy())
+            state.apply(self.trades[index], self.method)
+        self.state = state
+
+def _trade(t):
+    quantity = float(t['quantity'])
+    amount = fx.convert(t['total_cost'], t['currency'], t['date'])
+    return (t['action'] == BUY_ACTION, quantity, amount)
+
+# Книга лотов по всем активам. Обновляется по уведомлениям data.py:
+# сделка в конце истории актива применяется сразу, правка прошлой —
+# перепроигрывает только этот актив с места правки.
+class LotBook:
+    def __init__(self, method='fifo'):
+        self.method = method
+        self.dirty = True
+        self.fx_version = None
+        self.ledgers = {}
+        self.keys = {}
+        self.next_sequence = 0
+
+    def _add(self, t, sequence=None):
+        if sequence is None:
+            sequence = self.next_sequence
+            self.next_sequence += 1
+        key = (str(t['date']), sequence)
+        self.keys[t['id']] = (t['asset'], key)
+        ledger = self.ledgers.get(t['asset'])
+        if ledger is None:
+            ledger = self.ledgers[t['asset']] = AssetLedger(self.method)
+        ledger.insert(key, _trade(t))
+
+    def _remove(self, t):
+        asset, key = self.keys.pop(t['id'])
+        ledger = self.ledgers[asset]
+        ledger.remove(key)
+        if not len(ledger):
+            del self.ledgers[asset]
+        return key[1]
+
+    def on_change(self, event, index, old, new):
+        if event == 'reload':
+            self.dirty = True
+            return
+        if self.dirty:
+            return
+        # Изменённая сделка сохраняет своё место среди сделок того же дня.
+        sequence = self._remove(old) if old is not None else None
+        if new is not None:
+            self._add(new, sequence)
+
+    @profiling.timed()
+    def rebuild(self, transactions):
+        self.fx_version = fx.version()
+        self.ledgers = {}
+        self.keys = {}
+        ordered = sorted(range(len(transactions)), key=lambda position: (str(transactions[position]['date']), position))
+        for position in ordered:
+            self._add(transactions[position], position)
+        self.next_sequence = len(transactions)
+        self.dirty = False
+
+    def positions(self, prices=None):
+        # prices: {актив: цена в валюте отчёта} для нереализованной прибыли.
+        result = []
+        for asset in sorted(self.ledgers):
+            state = self.ledgers[asset].state
+            position = {
+                'asset': asset,
+                'quantity': state.quantity,
+                'average_cost': state.cost / state.quantity if state.quantity else 0.0,
+                'cost_basis': state.cost,
+                'realized': state.realized,
+                'unmatched': state.unmatched
+            }
+            price = prices.get(asset) if prices else None
+            if price is not None:
+                position['market_value'] = price * state.quantity
+                position['unrealized'] = position['market_value'] - state.cost
+            result.append(position)
+        return result
+
+lot_book = LotBook()
+subscribe(lot_book.on_change)
+
+@profiling.timed()
+def get_lot_book(method=None):
+    transactions = load_transactions()
+    if method is not None and method != lot_book.method:
+        if method not in LOT_METHODS:
+            raise ValueError(f"Неизвестный метод учёта лотов: {method}")
+        lot_book.method = method
+        lot_book.dirty = True
+    if lot_book.dirty or lot_book.fx_version != fx.version():
+        lot_book.rebuild(transactions)
+    return lot_book
+
+@profiling.timed()
+def get_positions(method=None, prices=None):
+    return get_lot_book(method).positions(prices)
@@ -1,4 +1,9 @@
-from ui import run_app
+import sys
 
 if __name__ == "__main__":
-    run_app() 
\ No newline at end of file
+    # python main.py report ... — отчёты без окна (см. cli.py).
+    if sys.argv[1:2] == ['report']:
+        from cli import main
+        sys.exit(main(sys.argv[2:]))
+    from ui import run_app
+    run_app()
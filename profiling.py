@@ -0,0 +1,152 @@
+import atexit
+import cProfile
+import functools
+import io
+import os
+import pstats
+import threading
+import time
+from collections import deque
+
+# Встроенное профилирование включается переменной окружения:
+#   FORTUNEST_PROFILE=1         — тайминги функций, счётчики и задержки действий
+#   FORTUNEST_PROFILE=cprofile  — плюс cProfile самого медленного действия
+# При выходе отчёт дописывается в FORTUNEST_PROFILE_LOG (fortunest_profile.log).
+# В окне отчёт открывается по Ctrl+Shift+P.
+MODE = os.environ.get('FORTUNEST_PROFILE', '').strip().lower()
+ENABLED = MODE not in ('', '0', 'false', 'no')
+CPROFILE = MODE == 'cprofile'
+LOG_FILE = os.environ.get('FORTUNEST_PROFILE_LOG', 'fortunest_profile.log')
+LATENCY_HISTORY = 1000
+PERCENTILES = (50, 90, 99)
+
+_lock = threading.Lock()
+calls = {}
+counters = {}
+actions = {}
+slowest = {
+    'name': None,
+    'seconds': 0.0,
+    'stats': None
+}
+
+def timed(name=None):
+    def decorate(func):
+        if not ENABLED:
+            return func
+        label = name or f"{func.__module__}.{func.__qualname__}"
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                _record_call(label, time.perf_counter() - started)
+        return wrapper
+    return decorate
+
+def _record_call(label, seconds):
+    with _lock:
+        entry = calls.get(label)
+        if entry is None:
+            entry = calls[label] = {'count': 0, 'total': 0.0, 'max': 0.0}
+        entry['count'] += 1
+        entry['total'] += seconds
+        entry['max'] = max(entry['max'], seconds)
+
+def count(name, amount=1):
+    if not ENABLED:
+        return
+    with _lock:
+        counters[name] = counters.get(name, 0) + amount
+
+# --- Действия пользователя ---
+# Действие начинается в потоке Tk, его задачи выполняются в рабочем
+# потоке, а завершается оно, когда результат отрисован.
+def start_action(name):
+    if not ENABLED:
+        return None
+    with _lock:
+        snapshot = dict(counters)
+    return {
+        'name': name,
+        'started': time.perf_counter(),
+        'counters': snapshot,
+        'profile': cProfile.Profile() if CPROFILE else None
+    }
+
+def profiled(action, func):
+    if action is None or action['profile'] is None:
+        return func
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        action['profile'].enable()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            action['profile'].disable()
+    return wrapper
+
+def finish_action(action):
+    if action is None:
+        return
+    seconds = time.perf_counter() - action['started']
+    with _lock:
+        entry = actions.get(action['name'])
+        if entry is None:
+            entry = actions[action['name']] = {
+                'latencies': deque(maxlen=LATENCY_HISTORY),
+                'parses': deque(maxlen=LATENCY_HISTORY)
+            }
+        entry['latencies'].append(seconds)
+        entry['parses'].append(counters.get('parses', 0) - action['counters'].get('parses', 0))
+        if action['profile'] is not None and seconds > slowest['seconds']:
+            stream = io.StringIO()
+            pstats.Stats(action['profile'], stream=stream).sort_stats('cumulative').print_stats(25)
+            slowest.update(name=action['name'], seconds=seconds, stats=stream.getvalue())
+
+# --- Отчёт ---
+def _percentile(values, percent):
+    ordered = sorted(values)
+    position = max(0, min(len(ordered) - 1, round(percent / 100 * len(ordered)) - 1))
+    return ordered[position]
+
+def report():
+    if not ENABLED:
+        return "Профилирование выключено. Запустите приложение с FORTUNEST_PROFILE=1."
+    with _lock:
+        lines = ["== Действия (мс) =="]
+        header = "".join(f"{'p' + str(p):>9}" for p in PERCENTILES)
+        lines.append(f"{'действие':<24}{'раз':>6}{header}{'max':>9}{'разборов':>10}")
+        for name, entry in sorted(actions.items()):
+            latencies = entry['latencies']
+            values = "".join(f"{_percentile(latencies, p) * 1000:9.1f}" for p in PERCENTILES)
+            parses = sum(entry['parses']) / len(entry['parses'])
+            lines.append(f"{name:<24}{len(latencies):>6}{values}{max(latencies) * 1000:9.1f}{parses:10.2f}")
+        lines.append("")
+        lines.append("== Функции (мс) ==")
+        lines.append(f"{'функция':<48}{'вызовов':>9}{'всего':>11}{'среднее':>10}{'max':>10}")
+        for name, entry in sorted(calls.items(), key=lambda item: item[1]['total'], reverse=True):
+            lines.append(f"{name:<48}{entry['count']:>9}{entry['total'] * 1000:11.1f}"
+                         f"{entry['total'] / entry['count'] * 1000:10.2f}{entry['max'] * 1000:10.1f}")
+        lines.append("")
+        lines.append("== Счётчики ==")
+        for name, value in sorted(counters.items()):
+            lines.append(f"{name:<24}{value:>14}")
+        if slowest['stats']:
+            lines.append("")
+            lines.append(f"== cProfile самого медленного действия: {slowest['name']} "
+                         f"({slowest['seconds'] * 1000:.1f} мс) ==")
+            lines.append(slowest['stats'])
+    return "\n".join(lines)
+
+def dump(path=None):
+    with open(path or LOG_FILE, 'a', encoding='utf-8') as file:
+        file.write(f"--- {time.strftime('%Y-%m-%d %H:%M:%S')} ---\n")
+        file.write(report())
+        file.write("\n\n")
+
+if ENABLED:
+    atexit.register(dump)
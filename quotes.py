@@ -0,0 +1,289 @@
+import csv
+import http.client
+import json
+import os
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlencode, urlsplit
+
+import fx
+import profiling
+
+# Источник котировок: путь к локальному файлу (CSV с колонками
+# asset,exchange,price,currency или JSON-список таких записей) либо
+# HTTP(S)-адрес сервиса, который отвечает на
+#   GET <адрес>?symbols=KCEL:KASE,AAPL:NASDAQ
+# JSON вида {"quotes": [{"asset": ..., "exchange": ..., "price": ..., "currency": ...}]}.
+QUOTES_SOURCE = os.environ.get('FORTUNEST_QUOTES', 'quotes.csv')
+# Полученные котировки хранятся на диске и считаются свежими QUOTE_TTL_SECONDS.
+# Устаревшие показываются сразу, а обновляются в отдельном потоке.
+QUOTES_CACHE_FILE = 'quotes_cache.json'
+QUOTE_TTL_SECONDS = 15 * 60
+BATCH_SIZE = 50
+POOL_SIZE = 4
+REQUEST_TIMEOUT = 10
+
+class QuoteError(Exception):
+    pass
+
+# --- Поставщики ---
+# fetch получает список ключей (актив, биржа) и возвращает
+# {ключ: (цена, валюта)} для тех, по которым котировка нашлась.
+class QuoteProvider:
+    def fetch(self, keys):
+        raise NotImplementedError
+
+class LocalFileQuoteProvider(QuoteProvider):
+    # Для работы без сети и для проверок. Пустая биржа в файле подходит к любой.
+    def __init__(self, path):
+        self.path = path
+        self.fingerprint = None
+        self.quotes = {}
+
+    def _load(self):
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            self.fingerprint = None
+            self.quotes = {}
+            return
+        fingerprint = (stat.st_mtime_ns, stat.st_size)
+        if fingerprint == self.fingerprint:
+            return
+        if self.path.endswith('.json'):
+            with open(self.path, 'r', encoding='utf-8') as file:
+                records = json.load(file)
+        else:
+            with open(self.path, 'r', encoding='utf-8-sig', newline='') as file:
+                records = list(csv.DictReader(file))
+        quotes = {}
+        for record in records:
+            try:
+                price = float(record['price'])
+            except (KeyError, TypeError, ValueError):
+                continue
+            key = (str(record.get('asset', '')).strip(), str(record.get('exchange') or '').strip())
+            quotes[key] = (price, str(record.get('currency') or fx.REFERENCE_CURRENCY).strip().upper())
+        self.quotes = quotes
+        self.fingerprint = fingerprint
+
+    def fetch(self, keys):
+        self._load()
+        result = {}
+        for asset, exchange in keys:
+            quote = self.quotes.get((asset, exchange)) or self.quotes.get((asset, ''))
+            if quote is not None:
+                result[(asset, exchange)] = quote
+        return result
+
+class HttpQuoteProvider(QuoteProvider):
+    # Тикеры запрашиваются пачками по batch_size, пачки идут параллельно,
+    # а соединения (keep-alive) переиспользуются между запросами.
+    def __init__(self, url, batch_size=BATCH_SIZE, pool_size=POOL_SIZE, timeout=REQUEST_TIMEOUT):
+        parts = urlsplit(url)
+        if parts.scheme not in ('http', 'https'):
+            raise QuoteError(f"Неподдерживаемый адрес котировок: {url}")
+        self.connection_class = http.client.HTTPSConnection if parts.scheme == 'https' else http.client.HTTPConnection
+        self.host = parts.netloc
+        self.path = parts.path or '/'
+        self.query = parts.query
+        self.batch_size = batch_size
+        self.pool_size = pool_size
+        self.timeout = timeout
+        self.idle = queue.LifoQueue()
+
+    def _acquire(self):
+        try:
+            return self.idle.get_nowait()
+        except queue.Empty:
+            return self.connection_class(self.host, timeout=self.timeout)
+
+    def _release(self, connection):
+        if self.idle.qsize() < self.pool_size:
+            self.idle.put(connection)
+        else:
+            connection.close()
+
+    def _get(self, path):
+        connection = self._acquire()
+        try:
+            connection.request('GET', path, headers={'Accept': 'application/json'})
+            response = connection.getresponse()
+            body = response.read()
+        except (OSError, http.client.HTTPException) as error:
+            connection.close()
+            raise QuoteError(f"Сервис котировок недоступен: {error}")
+        if response.will_close:
+            connection.close()
+        else:
+            self._release(connection)
+        profiling.count('quote_requests')
+        if response.status != 200:
+            raise QuoteError(f"Сервис котировок вернул {response.status} {response.reason}")
+        return json.loads(body)
+
+    def _fetch_batch(self, keys):
+        symbols = ','.join(f"{asset}:{exchange}" if exchange else asset for asset, exchange in keys)
+        query = urlencode({'symbols': symbols})
+        content = self._get(f"{self.path}?{self.query + '&' if self.query else ''}{query}")
+        result = {}
+        requested = set(keys)
+        for record in content.get('quotes', []):
+            key = (record.get('asset'), record.get('exchange') or '')
+            if key not in requested:
+                continue
+            try:
+                result[key] = (float(record['price']), str(record.get('currency') or fx.REFERENCE_CURRENCY).upper())
+            except (KeyError, TypeError, ValueError):
+                continue
+        return result
+
+    def fetch(self, keys):
+        batches = [keys[start:start + self.batch_size] for start in range(0, len(keys), self.batch_size)]
+        result = {}
+        if not batches:
+            return result
+        with ThreadPoolExecutor(max_workers=min(self.pool_size, len(batches))) as executor:
+            for quotes in executor.map(self._fetch_batch, batches):
+                result.update(quotes)
+        return result
+
+def create_provider(source=None):
+    source = source or QUOTES_SOURCE
+    if source.startswith(('http://', 'https://')):
+        return HttpQuoteProvider(source)
+    return LocalFileQuoteProvider(source)
+
+# --- Кэш на диске ---
+class QuoteCache:
+    def __init__(self, path=QUOTES_CACHE_FILE, ttl=QUOTE_TTL_SECONDS):
+        self.path = path
+        self.ttl = ttl
+        self.entries = None
+        self.lock = threading.Lock()
+
+    def _ensure_loaded(self):
+        if self.entries is not None:
+            return
+        self.entries = {}
+        try:
+            with open(self.path, 'r', encoding='utf-8') as file:
+                records = json.load(file)
+        except (FileNotFoundError, ValueError):
+            return
+        for record in records:
+            self.entries[(record['asset'], record['exchange'])] = (
+                record['price'], record['currency'], record['fetched_at'])
+
+    def lookup(self, keys, now=None):
+        # Возвращает все известные котировки (даже устаревшие) и ключи,
+        # которые нужно обновить.
+        now = time.time() if now is None else now
+        found = {}
+        stale = []
+        with self.lock:
+            self._ensure_loaded()
+            for key in keys:
+                entry = self.entries.get(key)
+                if entry is not None:
+                    found[key] = entry[:2]
+                if entry is None or now - entry[2] >= self.ttl:
+                    stale.append(key)
+        return found, stale
+
+    def store(self, quotes, now=None):
+        now = time.time() if now is None else now
+        with self.lock:
+            self._ensure_loaded()
+            for key, (price, currency) in quotes.items():
+                self.entries[key] = (price, currency, now)
+            records = [{'asset': asset, 'exchange': exchange, 'price': price, 'currency': currency, 'fetched_at': fetched_at}
+                       for (asset, exchange), (price, currency, fetched_at) in self.entries.items()]
+            temp_path = self.path + '.tmp'
+            with open(temp_path, 'w', encoding='utf-8') as file:
+                json.dump(records, file, ensure_ascii=False)
+            os.replace(temp_path, self.path)
+
+# --- Сервис котировок ---
+# Цены сразу берутся из кэша; устаревшие и недостающие обновляются
+# в фоне (stale-while-revalidate), а по готовности вызывается on_done.
+class QuoteService:
+    def __init__(self, provider, cache):
+        self.provider = provider
+        self.cache = cache
+        self.lock = threading.Lock()
+        self.pending = set()
+        # Тикеры, которых у поставщика не нашлось, не запрашиваются повторно до истечения TTL.
+        self.misses = {}
+
+    def lookup(self, keys):
+        found, stale = self.cache.lookup(keys)
+        now = time.time()
+        with self.lock:
+            stale = [key for key in stale
+                     if key not in self.pending and now - self.misses.get(key, -self.cache.ttl) >= self.cache.ttl]
+        return found, stale
+
+    @profiling.timed()
+    def refresh(self, keys):
+        quotes = {}
+        try:
+            quotes = self.provider.fetch(list(keys))
+        finally:
+            # При ошибке сети повтор тоже откладывается, чтобы не долбить сервис.
+            now = time.time()
+            with self.lock:
+                for key in keys:
+                    if key not in quotes:
+                        self.misses[key] = now
+        if quotes:
+            self.cache.store(quotes, now)
+        return quotes
+
+    def refresh_async(self, keys, on_done=None, on_error=None):
+        with self.lock:
+            keys = [key for key in keys if key not in self.pending]
+            self.pending.update(keys)
+        if not keys:
+            return False
+
+        def run():
+            try:
+                quotes = self.refresh(keys)
+            except Exception as error:
+                if on_error is not None:
+                    on_error(error)
+                return
+            finally:
+                with self.lock:
+                    self.pending.difference_update(keys)
+            if on_done is not None:
+                on_done(quotes)
+
+        threading.Thread(target=run, daemon=True).start()
+        return True
+
+_service = None
+
+def get_service():
+    global _service
+    if _service is None:
+        _service = QuoteService(create_provider(), QuoteCache())
+    return _service
+
+@profiling.timed()
+def get_market_prices(asset_exchanges):
+    # asset_exchanges: {актив: биржа}. Возвращает {актив: цена в валюте
+    # отчёта} по текущему курсу и ключи, которые стоит обновить.
+    found, stale = get_service().lookup(list(asset_exchanges.items()))
+    prices = {}
+    for (asset, _), (price, currency) in found.items():
+        prices[asset] = price * fx.factor(currency)
+    return prices, stale
+
+def market_value(positions, prices):
+    # Позиции без котировки учитываются по цене покупки.
+    return sum(prices[p['asset']] * p['quantity'] if p['asset'] in prices else p['cost_basis']
+               for p in positions)
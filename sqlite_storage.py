@@ -0,0 +1,148 @@
+import os
+import sqlite3
+import sys
+from pathlib import Path
+
+COLUMNS = (
+    'id', 'date', 'company_name', 'asset', 'action', 'quantity', 'price_per_share',
+    'total_cost', 'currency', 'exchange', 'broker', 'settlement_date', 'deal_number'
+)
+FILTER_COLUMNS = ('asset', 'action', 'broker')
+DISTINCT_COLUMNS = ('asset', 'action', 'broker', 'currency', 'exchange')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS transactions (
+    id TEXT PRIMARY KEY,
+    date TEXT,
+    company_name TEXT,
+    asset TEXT,
+    action TEXT,
+    quantity NUMERIC,
+    price_per_share REAL,
+    total_cost REAL,
+    currency TEXT,
+    exchange TEXT,
+    broker TEXT,
+    settlement_date TEXT,
+    deal_number TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_transactions_asset ON transactions(asset);
+CREATE INDEX IF NOT EXISTS idx_transactions_broker ON transactions(broker);
+CREATE INDEX IF NOT EXISTS idx_transactions_action ON transactions(action);
+CREATE INDEX IF NOT EXISTS idx_transactions_date ON transactions(date);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value INTEGER
+);
+"""
+
+_INSERT = "INSERT INTO transactions ({}) VALUES ({})".format(
+    ', '.join(COLUMNS), ', '.join('?' for _ in COLUMNS))
+_UPSERT = _INSERT + " ON CONFLICT(id) DO UPDATE SET {}".format(
+    ', '.join(f"{column} = excluded.{column}" for column in COLUMNS[1:]))
+_SELECT = "SELECT {} FROM transactions".format(', '.join(COLUMNS))
+
+_BUMP_REVISION = ("INSERT INTO meta (key, value) VALUES ('revision', 1) "
+                  "ON CONFLICT(key) DO UPDATE SET value = value + 1")
+
+_connections = {}
+
+def connect(path):
+    connection = _connections.get(path)
+    if connection is None:
+        connection = sqlite3.connect(path)
+        connection.execute('PRAGMA journal_mode=WAL')
+        connection.execute('PRAGMA synchronous=NORMAL')
+        connection.executescript(SCHEMA)
+        _connections[path] = connection
+    return connection
+
+def open_readonly(path):
+    # Для отчётов: база открывается только на чтение, без схемы и WAL,
+    # и дальше connect(path) возвращает это соединение. Если рядом нет
+    # файла -wal, все данные лежат в самой базе и её можно читать как
+    # неизменяемую, не создавая -wal и -shm. Иначе базу держит открытой
+    # приложение, и чтение идёт через его уже существующие -wal и -shm.
+    close(path)
+    mode = 'mode=ro' if os.path.exists(path + '-wal') else 'immutable=1'
+    connection = sqlite3.connect(Path(path).resolve().as_uri() + '?' + mode, uri=True)
+    try:
+        found = connection.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'transactions'").fetchone()
+    except sqlite3.DatabaseError:
+        connection.close()
+        raise
+    if found is None:
+        connection.close()
+        raise ValueError(f"В базе {path} нет таблицы transactions")
+    _connections[path] = connection
+    return connection
+
+def close(path):
+    connection = _connections.pop(path, None)
+    if connection is not None:
+        connection.close()
+
+def _to_row(transaction):
+    return tuple(transaction.get(column, '') for column in COLUMNS)
+
+def _to_transaction(row):
+    return dict(zip(COLUMNS, row))
+
+def load_all(path):
+    cursor = connect(path).execute(_SELECT + " ORDER BY rowid")
+    return [_to_transaction(row) for row in cursor]
+
+def replace_all(path, transactions):
+    connection = connect(path)
+    with connection:
+        connection.execute("DELETE FROM transactions")
+        connection.executemany(_UPSERT, (_to_row(t) for t in transactions))
+        connection.execute(_BUMP_REVISION)
+
+def apply_record(path, record):
+    connection = connect(path)
+    with connection:
+        if record['op'] in ('add', 'update'):
+            connection.execute(_UPSERT, _to_row(record['transaction']))
+        elif record['op'] == 'delete':
+            connection.execute("DELETE FROM transactions WHERE id = ?", (record['id'],))
+        connection.execute(_BUMP_REVISION)
+
+# Номер ревизии растёт при каждой записи. В отличие от mtime файла он не
+# меняется от контрольных точек WAL, поэтому годится как отпечаток данных.
+def revision(path):
+    row = connect(path).execute("SELECT value FROM meta WHERE key = 'revision'").fetchone()
+    return row[0] if row else 0
+
+# Выборки по индексам без загрузки всей таблицы (отчёты cli.py).
+def query(path, **filters):
+    conditions = []
+    params = []
+    for column in FILTER_COLUMNS:
+        value = filters.get(column)
+        if value is not None:
+            conditions.append(f"{column} = ?")
+            params.append(value)
+    sql = _SELECT
+    if conditions:
+        sql += " WHERE " + " AND ".join(conditions)
+    sql += " ORDER BY rowid"
+    return [_to_transaction(row) for row in connect(path).execute(sql, params)]
+
+def distinct_values(path, column):
+    if column not in DISTINCT_COLUMNS:
+        raise ValueError(f"Неизвестная колонка: {column}")
+    cursor = connect(path).execute(
+        f"SELECT DISTINCT {column} FROM transactions WHERE {column} IS NOT NULL ORDER BY {column}")
+    return [row[0] for row in cursor]
+
+if __name__ == '__main__':
+    # Разовый перенос: python sqlite_storage.py [investments.json] [investments.db]
+    import data
+    if len(sys.argv) > 1:
+        data.INVESTMENTS_FILE = sys.argv[1]
+    if len(sys.argv) > 2:
+        data.SQLITE_FILE = sys.argv[2]
+    count = data.migrate_json_to_sqlite()
+    print(f"Перенесено транзакций: {count} -> {data.SQLITE_FILE}")
@@ -0,0 +1,65 @@
+import queue
+import threading
+
+POLL_INTERVAL_MS = 30
+
+# Фоновый исполнитель для работы с файлом и пересчётов. Все задачи идут
+# через один рабочий поток по порядку, поэтому сохранения никогда не
+# перемешиваются. Результаты возвращаются в поток Tk через root.after.
+class TaskScheduler:
+    def __init__(self, root, poll_interval=POLL_INTERVAL_MS):
+        self.root = root
+        self.poll_interval = poll_interval
+        self.jobs = queue.Queue()
+        self.results = queue.Queue()
+        self.generations = {}
+        self.worker = threading.Thread(target=self._run, daemon=True)
+        self.worker.start()
+        self.root.after(self.poll_interval, self._poll)
+
+    def submit(self, func, *args, on_done=None, on_error=None, key=None):
+        # Задача с ключом отменяет все ещё не выполненные задачи с тем же
+        # ключом, а их результаты, если уже посчитаны, отбрасываются.
+        generation = None
+        if key is not None:
+            generation = self.generations[key] = self.generations.get(key, 0) + 1
+        self.jobs.put((func, args, on_done, on_error, key, generation))
+
+    def call_soon(self, callback, *args):
+        # Потокобезопасно: callback будет вызван в потоке Tk.
+        self.results.put((callback, args, None, None))
+
+    def _is_stale(self, key, generation):
+        return key is not None and self.generations.get(key) != generation
+
+    def _run(self):
+        while True:
+            job = self.jobs.get()
+            if job is None:
+                return
+            func, args, on_done, on_error, key, generation = job
+            if self._is_stale(key, generation):
+                continue
+            try:
+                result = func(*args)
+            except Exception as error:
+                if on_error is not None:
+                    self.results.put((on_error, (error,), key, generation))
+                continue
+            if on_done is not None:
+                self.results.put((on_done, (result,), key, generation))
+
+    def _poll(self):
+        try:
+            while True:
+                try:
+                    callback, args, key, generation = self.results.get_nowait()
+                except queue.Empty:
+                    break
+                if not self._is_stale(key, generation):
+                    callback(*args)
+        finally:
+            self.root.after(self.poll_interval, self._poll)
+
+    def shutdown(self):
+        self.jobs.put(None)
@@ -0,0 +1,209 @@
+from datetime import date, datetime, timedelta
+from bisect import bisect_left, bisect_right
+from itertools import accumulate
+
+from data import load_transactions, subscribe
+import fx
+import profiling
+
+BUY_ACTION = 'Покупка'
+FREQUENCIES = ('D', 'W', 'M')
+
+def parse_day(value):
+    try:
+        return datetime.strptime(value, '%Y-%m-%d').date()
+    except (TypeError, ValueError):
+        return None
+
+def _sign(t):
+    return 1 if t['action'] == BUY_ACTION else -1
+
+# Дерево Фенвика: изменение одного элемента, сумма с начала по любой
+# элемент и добавление элемента в конец — за O(log N).
+class FenwickTree:
+    def __init__(self, values):
+        tree = [0.0] + list(values)
+        for i in range(1, len(tree)):
+            parent = i + (i & -i)
+            if parent < len(tree):
+                tree[parent] += tree[i]
+        self.tree = tree
+
+    def add(self, position, delta):
+        position += 1
+        while position < len(self.tree):
+            self.tree[position] += delta
+            position += position & -position
+
+    def append(self, value):
+        # Новый узел n покрывает элементы (n - lowbit(n), n]: это сам
+        # элемент плюс разность двух префиксных сумм.
+        position = len(self.tree)
+        covered = position - (position & -position)
+        self.tree.append(value + self.prefix(position - 2) - self.prefix(covered - 1))
+
+    def prefix(self, position):
+        position = min(position + 1, len(self.tree) - 1)
+        total = 0.0
+        while position > 0:
+            total += self.tree[position]
+            position -= position & -position
+        return total
+
+# Суммы только по датам, на которые есть сделки: память растёт с числом
+# сделок, а не с длиной периода. Префиксные суммы — дерево Фенвика над
+# отсортированными датами. Изменение известной даты и новая дата позже
+# всех известных (обычная сделка «сегодня») обходятся в O(log N); дата
+# в середине истории перестраивает индекс лениво, при следующем запросе.
+class DatedSeries:
+    def __init__(self, amounts=None):
+        self.amounts = amounts or {}
+        self.days = None
+        self.sums = None
+
+    def add(self, day, delta):
+        if day in self.amounts:
+            self.amounts[day] += delta
+            if self.days is not None:
+                self.sums.add(bisect_left(self.days, day), delta)
+        else:
+            self.amounts[day] = delta
+            if self.days is None:
+                return
+            if not self.days or day > self.days[-1]:
+                self.days.append(day)
+                self.sums.append(delta)
+            else:
+                self.days = None
+
+    def _index(self):
+        if self.days is None:
+            self.days = sorted(self.amounts)
+            self.sums = FenwickTree([self.amounts[day] for day in self.days])
+
+    def prefix(self, day):
+        self._index()
+        position = bisect_right(self.days, day) - 1
+        return self.sums.prefix(position) if position >= 0 else 0.0
+
+    def active_days(self):
+        self._index()
+        return [day for day in self.days if self.amounts[day]]
+
+    def cumulative(self):
+        self._index()
+        return self.days, list(accumulate(self.amounts[day] for day in self.days))
+
+# Индекс по датам: вложенный капитал и позиции по каждому активу хранятся
+# как суммы по датам сделок, так что состояние портфеля на дату и поток
+# средств за период вычисляются префиксными суммами.
+class PortfolioTimeline:
+    def __init__(self):
+        self.dirty = True
+        self.fx_version = None
+        self.capital = DatedSeries()
+        self.positions = {}
+
+    def _apply(self, t, sign):
+        day = parse_day(t['date'])
+        if day is None:
+            return
+        direction = _sign(t) * sign
+        self.capital.add(day, direction * fx.convert(t['total_cost'], t['currency'], t['date']))
+        series = self.positions.get(t['asset'])
+        if series is None:
+            series = self.positions[t['asset']] = DatedSeries()
+        series.add(day, direction * t['quantity'])
+
+    @profiling.timed()
+    def rebuild(self, transactions):
+        self.fx_version = fx.version()
+        capital = {}
+        positions = {}
+        for t in transactions:
+            day = parse_day(t['date'])
+            if day is None:
+                continue
+            direction = _sign(t)
+            capital[day] = capital.get(day, 0.0) + direction * fx.convert(t['total_cost'], t['currency'], t['date'])
+            amounts = positions.get(t['asset'])
+            if amounts is None:
+                amounts = positions[t['asset']] = {}
+            amounts[day] = amounts.get(day, 0.0) + direction * t['quantity']
+        self.capital = DatedSeries(capital)
+        self.positions = {asset: DatedSeries(amounts) for asset, amounts in positions.items()}
+        self.dirty = False
+
+    def on_change(self, event, index, old, new):
+        if event == 'reload':
+            self.dirty = True
+            return
+        if self.dirty:
+            return
+        if old is not None:
+            self._apply(old, -1)
+        if new is not None:
+            self._apply(new, 1)
+
+    # Вложенный капитал — O(log N); позиции — O(A·log N), где A — число
+    # активов: по одному запросу к ряду каждого актива.
+    def state_as_of(self, day):
+        positions = {}
+        for asset, series in self.positions.items():
+            quantity = series.prefix(day)
+            if abs(quantity) > 1e-9:
+                positions[asset] = quantity
+        return {'invested': self.capital.prefix(day), 'positions': positions}
+
+    def net_flow(self, start, end):
+        if end < start:
+            return 0.0
+        return self.capital.prefix(end) - self.capital.prefix(start - timedelta(days=1))
+
+    def date_range(self):
+        active = self.capital.active_days()
+        if not active:
+            active = sorted(day for series in self.positions.values() for day in series.active_days())
+            if not active:
+                return None
+        return (active[0], active[-1])
+
+    def series(self, frequency='D', end=None):
+        if frequency not in FREQUENCIES:
+            raise ValueError(f"Неизвестная периодичность: {frequency}")
+        bounds = self.date_range()
+        if bounds is None:
+            return []
+        first, last = bounds
+        last = max(last, end or last)
+        days, cumulative = self.capital.cumulative()
+        points = []
+        position = -1
+        day = _period_end(first, frequency)
+        while True:
+            point = min(day, last)
+            while position + 1 < len(days) and days[position + 1] <= point:
+                position += 1
+            points.append((point, cumulative[position] if position >= 0 else 0.0))
+            if day >= last:
+                break
+            day = _period_end(day + timedelta(days=1), frequency)
+        return points
+
+def _period_end(day, frequency):
+    if frequency == 'W':
+        return day + timedelta(days=6 - day.weekday())
+    if frequency == 'M':
+        following = date(day.year + day.month // 12, day.month % 12 + 1, 1)
+        return following - timedelta(days=1)
+    return day
+
+timeline = PortfolioTimeline()
+subscribe(timeline.on_change)
+
+@profiling.timed()
+def get_timeline():
+    transactions = load_transactions()
+    if timeline.dirty or timeline.fx_version != fx.version():
+        timeline.rebuild(transactions)
+    return timeline
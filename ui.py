@@ -1,62 +1,443 @@
 import tkinter as tk
-from tkinter import ttk, messagebox
-from data import load_transactions, save_transactions, format_date, format_currency
-from logic import get_stats, filter_transactions, plot_pie_chart
+from tkinter import ttk, messagebox, filedialog
+from data import add_transaction, update_transaction, delete_transaction, check_trade_date, load_startup_snapshot, save_startup_snapshot, format_date, format_currency
+from logic import get_stats, get_asset_totals, get_distinct_values, get_asset_exchanges, filter_transactions, get_portfolio_series, plot_pie_chart, plot_dynamics_chart, load_chart_backend, DYNAMICS_FREQUENCIES
+from lots import get_positions
+from quotes import get_service as get_quote_service, get_market_prices, market_value
+from tasks import TaskScheduler
 from datetime import datetime
+import threading
 import uuid
+import fx
+import profiling
+from import_export import import_file, export_file
 
 # Глобальные переменные для виджетов
 root = None
+scheduler = None
 filter_asset = None
 filter_action = None
 filter_broker = None
 tree = None
+table_scrollbar = None
 empty_state = None
 total_value_label = None
+total_note_label = None
 assets_count_label = None
 transactions_count_label = None
 chart_frame = None
+pie_frame = None
+dynamics_frame = None
+dynamics_frequency = None
+report_currency = None
+report_rate_mode = None
+
+RATE_MODE_LABELS = {
+    'По курсу сделки': 'trade',
+    'По текущему курсу': 'current'
+}
+
+# Виртуальная таблица: в Treeview живут только видимые строки и запас
+# по TABLE_BUFFER строк сверху и снизу, остальные берутся из table_state['rows'].
+TABLE_BUFFER = 100
+ROW_HEIGHT = 20
+TABLE_COLUMNS = ('Дата', 'Актив', 'Действие', 'Кол-во', 'Цена', 'Сумма', 'Брокер', 'ID')
+SORT_KEYS = {
+    'Дата': lambda t: t['date'],
+    'Актив': lambda t: t['asset'],
+    'Действие': lambda t: t['action'],
+    'Кол-во': lambda t: t['quantity'],
+    'Цена': lambda t: t['price_per_share'],
+    'Сумма': lambda t: t['total_cost'],
+    'Брокер': lambda t: t['broker']
+}
+# Окно прибыли и убытков по лотам (lots.py), пока оно открыто.
+LOT_METHOD_LABELS = {
+    'FIFO': 'fifo',
+    'Средняя цена': 'average'
+}
+PNL_COLUMNS = ('Актив', 'Кол-во', 'Средняя цена', 'Вложено', 'Реализовано', 'Рыночная стоимость', 'Нереализовано')
+pnl_state = {
+    'window': None,
+    'tree': None,
+    'method': None,
+    'totals': None
+}
+table_state = {
+    'rows': [],
+    'offset': 0,
+    'start': 0,
+    'end': 0,
+    'stale': True,
+    'sort_column': None,
+    'sort_reverse': False
+}
+
+# --- Фоновые задачи ---
+# Чтение, сохранение и пересчёты выполняются в рабочем потоке (tasks.py),
+# а функции ниже только отрисовывают готовые результаты в потоке Tk.
+def show_error(error):
+    messagebox.showerror("Ошибка", str(error))
+
+def refresh_all(action=None):
+    filter_and_show_transactions(action, finish=False)
+    refresh_summary(action)
+    refresh_pnl()
+
+def run_in_background(action_name, func, *args):
+    action = profiling.start_action(action_name)
+    scheduler.submit(profiling.profiled(action, func), *args, on_error=show_error)
+    refresh_all(action)
+
+def _collect_summary(frequency):
+    summary = {
+        'stats': get_stats(),
+        'base_currency': fx.get_base_currency(),
+        'assets': get_distinct_values('asset'),
+        'brokers': get_distinct_values('broker'),
+        'asset_totals': get_asset_totals(),
+        'frequency': frequency,
+        'series': get_portfolio_series(frequency)
+    }
+    summary['market_value'], summary['stale_quotes'] = _collect_market_value()
+    _save_startup_summary(summary)
+    return summary
+
+# --- Котировки ---
+# Рыночная стоимость считается по котировкам из кэша (quotes.py). Устаревшие
+# котировки обновляются в отдельном потоке, после чего сводка пересчитывается.
+def _collect_market_value():
+    prices, stale = get_market_prices(get_asset_exchanges())
+    if not prices:
+        return None, stale
+    return market_value(get_positions(), prices), stale
+
+def refresh_quotes(keys):
+    get_quote_service().refresh_async(
+        keys,
+        on_done=lambda quotes: scheduler.call_soon(_on_quotes_updated, quotes),
+        on_error=lambda error: scheduler.call_soon(show_error, error))
+
+def _on_quotes_updated(quotes):
+    if quotes:
+        refresh_summary()
+        refresh_pnl()
+
+# --- Быстрый запуск ---
+# Карточки и фильтры сразу заполняются из снимка последнего запуска
+# (data.load_startup_snapshot), а полный пересчёт их затем перезаписывает.
+def _save_startup_summary(summary):
+    try:
+        save_startup_snapshot({
+            'stats': summary['stats'],
+            'base_currency': summary['base_currency'],
+            'rate_mode': fx.settings['rate_mode'],
+            'assets': summary['assets'],
+            'brokers': summary['brokers'],
+            'market_value': summary['market_value']
+        })
+    except OSError:
+        # Снимок только ускоряет запуск, без него всё работает как раньше.
+        pass
+
+def show_startup_snapshot(snapshot):
+    if snapshot is None or snapshot.get('base_currency') != fx.get_base_currency() \
+            or snapshot.get('rate_mode') != fx.settings['rate_mode']:
+        return
+    update_stats(snapshot['stats'], snapshot['base_currency'], snapshot.get('market_value'))
+    update_filters(snapshot['assets'], snapshot['brokers'])
+
+def refresh_summary(action=None):
+    frequency = DYNAMICS_FREQUENCIES[dynamics_frequency.get()]
+
+    def done(summary):
+        show_summary(summary)
+        profiling.finish_action(action)
+
+    scheduler.submit(profiling.profiled(action, _collect_summary), frequency,
+                     on_done=done, on_error=show_error, key='summary')
+
+@profiling.timed()
+def show_summary(summary):
+    update_stats(summary['stats'], summary['base_currency'], summary['market_value'])
+    update_filters(summary['assets'], summary['brokers'])
+    plot_pie_chart(pie_frame, summary['asset_totals'])
+    plot_dynamics_chart(dynamics_frame, summary['frequency'], summary['series'])
+    if summary['stale_quotes']:
+        refresh_quotes(summary['stale_quotes'])
+
+def _filter_rows(filters, sort_column, sort_reverse):
+    rows = filter_transactions(*filters)
+    if sort_column is not None:
+        return sorted(rows, key=SORT_KEYS[sort_column], reverse=sort_reverse)
+    # Без фильтра это сам список из кэша data.py, который рабочий поток
+    # меняет на месте; таблице нужна своя копия.
+    return list(rows)
 
 # --- Интерфейс ---
-def update_stats():
-    stats = get_stats()
-    total_value_label.config(text=f"{format_currency(stats['total'])} KZT")
+def update_stats(stats, base_currency, market_value=None):
+    # Без котировок показывается вложенная сумма, как раньше.
+    total = stats['total'] if market_value is None else market_value
+    unconverted = stats.get('unconverted_currencies')
+    total_value_label.config(text=f"{format_currency(total)} {base_currency}" + (" *" if unconverted else ""))
+    total_note_label.config(text=f"* без пересчёта, нет курса: {', '.join(unconverted)}" if unconverted else "")
     assets_count_label.config(text=stats['assets_count'])
     transactions_count_label.config(text=stats['transactions_count'])
 
-def update_filters():
-    transactions = load_transactions()
-    assets = ['Все активы'] + sorted(set(t['asset'] for t in transactions))
-    filter_asset['values'] = assets
-    brokers = ['Все брокеры'] + sorted(set(t['broker'] for t in transactions))
-    filter_broker['values'] = brokers
-
-def filter_and_show_transactions():
-    asset_filter = filter_asset.get()
-    action_filter = filter_action.get()
-    broker_filter = filter_broker.get()
-    filtered = filter_transactions(asset_filter, action_filter, broker_filter)
-    tree.delete(*tree.get_children())
+def update_filters(assets, brokers):
+    filter_asset['values'] = ['Все активы'] + assets
+    filter_broker['values'] = ['Все брокеры'] + brokers
+
+def _set_report_currency(currency, rate_mode):
+    fx.set_base_currency(currency)
+    fx.set_rate_mode(rate_mode)
+
+def change_report_currency():
+    action = profiling.start_action('currency')
+    scheduler.submit(_set_report_currency, report_currency.get(), RATE_MODE_LABELS[report_rate_mode.get()], on_error=show_error)
+    refresh_summary(action)
+    refresh_pnl()
+
+def filter_and_show_transactions(action=None, finish=True):
+    # Новый запрос отменяет ещё не завершённую фильтрацию.
+    filters = (filter_asset.get(), filter_action.get(), filter_broker.get())
+
+    def done(rows):
+        show_table_rows(rows)
+        if finish:
+            profiling.finish_action(action)
+
+    scheduler.submit(profiling.profiled(action, _filter_rows), filters, table_state['sort_column'], table_state['sort_reverse'],
+                     on_done=done, on_error=show_error, key='filter')
+
+@profiling.timed()
+def show_table_rows(rows):
+    table_state.update(rows=rows, offset=0, stale=True)
     empty_state.pack_forget()
-    if not filtered:
+    if not rows:
         empty_state.pack(fill=tk.BOTH, expand=True)
+    render_table_window()
+
+def sort_transactions_by(column):
+    if table_state['sort_column'] == column:
+        table_state['sort_reverse'] = not table_state['sort_reverse']
+    else:
+        table_state['sort_column'] = column
+        table_state['sort_reverse'] = False
+    arrow = ' ▼' if table_state['sort_reverse'] else ' ▲'
+    for name in SORT_KEYS:
+        tree.heading(name, text=name + (arrow if name == column else ''))
+    filter_and_show_transactions(profiling.start_action('sort'))
+
+def _visible_row_count():
+    return max(1, tree.winfo_height() // ROW_HEIGHT - 1)
+
+@profiling.timed()
+def render_table_window():
+    rows = table_state['rows']
+    total = len(rows)
+    visible = _visible_row_count()
+    offset = max(0, min(table_state['offset'], total - visible))
+    table_state['offset'] = offset
+    start, end = table_state['start'], table_state['end']
+    if table_state['stale'] or (offset <= start and start > 0) or (offset + visible >= end and end < total):
+        start = max(0, offset - TABLE_BUFFER)
+        end = min(total, offset + visible + TABLE_BUFFER)
+        tree.delete(*tree.get_children())
+        for t in rows[start:end]:
+            tree.insert('', 'end', values=(
+                format_date(t['date']),
+                t['asset'],
+                t['action'],
+                t['quantity'],
+                f"{format_currency(t['price_per_share'])} {t['currency']}",
+                f"{format_currency(t['total_cost'])} {t['currency']}",
+                t['broker'],
+                t['id']
+            ), tags=(t['action'],))
+        table_state.update(start=start, end=end, stale=False)
+    if end > start:
+        tree.yview_moveto((offset - start) / (end - start))
+    _update_table_scrollbar()
+
+def _update_table_scrollbar():
+    total = len(table_state['rows'])
+    if not total:
+        table_scrollbar.set(0, 1)
+        return
+    offset = table_state['offset']
+    table_scrollbar.set(offset / total, min(1, (offset + _visible_row_count()) / total))
+
+def on_table_scroll(*args):
+    total = len(table_state['rows'])
+    if args[0] == 'moveto':
+        table_state['offset'] = int(float(args[1]) * total)
+    elif args[0] == 'scroll':
+        step = _visible_row_count() if args[2] == 'pages' else 1
+        table_state['offset'] += int(args[1]) * step
+    render_table_window()
+
+def on_tree_yview(first, last):
+    # Прокрутка внутри отрисованного окна (колесо, клавиатура) идёт штатно,
+    # а у края окна подгружается следующая порция строк.
+    start, end = table_state['start'], table_state['end']
+    offset = start + round(float(first) * (end - start))
+    if offset == table_state['offset']:
+        return
+    table_state['offset'] = offset
+    visible = _visible_row_count()
+    if (offset <= start and start > 0) or (offset + visible >= end and end < len(table_state['rows'])):
+        root.after_idle(render_table_window)
+    else:
+        _update_table_scrollbar()
+
+def open_progress_modal(title):
+    modal = tk.Toplevel(root)
+    modal.title(title)
+    modal.transient(root)
+    modal.grab_set()
+    status = tk.Label(modal, text="Подготовка...", font=("Arial", 10))
+    status.pack(padx=20, pady=(15, 5))
+    bar = ttk.Progressbar(modal, length=300, maximum=1.0)
+    bar.pack(padx=20, pady=(5, 15))
+
+    def show_progress(rows, fraction):
+        if modal.winfo_exists():
+            status.config(text=f"Обработано строк: {rows}")
+            bar['value'] = fraction
+
+    # Прогресс приходит из рабочего потока и передаётся в поток Tk.
+    def progress(rows, fraction):
+        scheduler.call_soon(show_progress, rows, fraction)
+
+    def fail(error):
+        modal.destroy()
+        show_error(error)
+
+    return modal, progress, fail
+
+def import_transactions():
+    path = filedialog.askopenfilename(parent=root, title="Импорт транзакций", filetypes=[
+        ("CSV и Excel", "*.csv *.xlsx"), ("Все файлы", "*.*")])
+    if not path:
+        return
+    modal, progress, fail = open_progress_modal("Импорт транзакций")
+    action = profiling.start_action('import')
+
+    def done(result):
+        modal.destroy()
+        refresh_all(action)
+        message = (f"Добавлено: {result['added']}\n"
+                   f"Дубликатов (по номеру сделки): {result['duplicates']}\n"
+                   f"Ошибок: {len(result['errors'])}")
+        if result['errors']:
+            message += "\n\n" + "\n".join(f"Строка {line}: {error}" for line, error in result['errors'][:10])
+        messagebox.showinfo("Импорт завершён", message)
+
+    scheduler.submit(profiling.profiled(action, import_file), path, None, progress, on_done=done, on_error=fail)
+
+def export_transactions():
+    path = filedialog.asksaveasfilename(parent=root, title="Экспорт транзакций", defaultextension=".csv", filetypes=[
+        ("CSV", "*.csv"), ("Excel", "*.xlsx")])
+    if not path:
         return
-    for t in filtered:
-        tree.insert('', 'end', values=(
-            format_date(t['date']),
-            t['asset'],
-            t['action'],
-            t['quantity'],
-            f"{format_currency(t['price_per_share'])} {t['currency']}",
-            f"{format_currency(t['total_cost'])} {t['currency']}",
-            t['broker'],
-            t['id']
-        ), tags=(t['action'],))
-        tree.tag_configure('Покупка', background='#D1FAE5')
-        tree.tag_configure('Продажа', background='#FEE2E2')
+    modal, progress, fail = open_progress_modal("Экспорт транзакций")
+
+    def done(count):
+        modal.destroy()
+        messagebox.showinfo("Экспорт завершён", f"Выгружено транзакций: {count}")
+
+    scheduler.submit(export_file, path, table_state['rows'], progress, on_done=done, on_error=fail)
+
+def refresh_pnl():
+    if pnl_state['window'] is None:
+        return
+    method = LOT_METHOD_LABELS[pnl_state['method'].get()]
+    scheduler.submit(_collect_pnl, method, on_done=show_pnl, on_error=show_error, key='pnl')
+
+def _collect_pnl(method):
+    prices, _ = get_market_prices(get_asset_exchanges())
+    return get_positions(method, prices)
+
+def show_pnl(positions):
+    if pnl_state['window'] is None:
+        return
+    tree = pnl_state['tree']
+    tree.delete(*tree.get_children())
+    for position in positions:
+        tree.insert('', tk.END, values=(
+            position['asset'],
+            f"{position['quantity']:g}",
+            format_currency(position['average_cost']),
+            format_currency(position['cost_basis']),
+            format_currency(position['realized']),
+            format_currency(position['market_value']) if 'market_value' in position else '—',
+            format_currency(position['unrealized']) if 'unrealized' in position else '—'
+        ), tags=('loss',) if position['realized'] + position.get('unrealized', 0) < 0 else ())
+    base_currency = fx.get_base_currency()
+    invested = sum(position['cost_basis'] for position in positions)
+    realized = sum(position['realized'] for position in positions)
+    text = (f"Вложено в открытые позиции: {format_currency(invested)} {base_currency}    "
+            f"Реализовано: {format_currency(realized)} {base_currency}")
+    priced = [position for position in positions if 'unrealized' in position]
+    if priced:
+        unrealized = sum(position['unrealized'] for position in priced)
+        text += f"    Нереализовано: {format_currency(unrealized)} {base_currency}"
+    pnl_state['totals'].config(text=text)
+
+def open_pnl_window():
+    if pnl_state['window'] is not None:
+        pnl_state['window'].lift()
+        return
+    window = tk.Toplevel(root)
+    window.title("Прибыль и убыток")
+
+    def close():
+        pnl_state['window'] = None
+        window.destroy()
+
+    window.protocol("WM_DELETE_WINDOW", close)
+    controls = tk.Frame(window)
+    controls.pack(fill=tk.X, padx=5, pady=5)
+    tk.Label(controls, text="Учёт лотов").pack(side=tk.LEFT, padx=5)
+    method = ttk.Combobox(controls, values=list(LOT_METHOD_LABELS), state='readonly', width=14)
+    method.set('FIFO')
+    method.pack(side=tk.LEFT, padx=5)
+    method.bind('<<ComboboxSelected>>', lambda e: refresh_pnl())
+    tree = ttk.Treeview(window, columns=PNL_COLUMNS, show='headings', height=20)
+    for column in PNL_COLUMNS:
+        tree.heading(column, text=column)
+    tree.tag_configure('loss', foreground='#B91C1C')
+    tree.pack(fill=tk.BOTH, expand=True, padx=5, pady=5)
+    totals = tk.Label(window, text="", font=("Arial", 10, "bold"))
+    totals.pack(fill=tk.X, padx=5, pady=5)
+    pnl_state.update(window=window, tree=tree, method=method, totals=totals)
+    refresh_pnl()
+
+def open_profile_panel():
+    panel = tk.Toplevel(root)
+    panel.title("Производительность")
+    buttons = tk.Frame(panel)
+    buttons.pack(fill=tk.X, padx=5, pady=5)
+    text = tk.Text(panel, font=("Courier New", 9), width=120, height=40, wrap='none')
+    text.pack(fill=tk.BOTH, expand=True, padx=5, pady=5)
+
+    def refresh():
+        text.delete('1.0', tk.END)
+        text.insert(tk.END, profiling.report())
+
+    tk.Button(buttons, text="Обновить", command=refresh).pack(side=tk.LEFT, padx=5)
+    if profiling.ENABLED:
+        tk.Button(buttons, text="Записать в журнал", command=profiling.dump).pack(side=tk.LEFT, padx=5)
+    refresh()
 
 def open_add_modal():
     def submit():
+        try:
+            check_trade_date(date_entry.get())
+        except ValueError as error:
+            messagebox.showerror("Ошибка", f"Проверьте дату: {error}")
+            return
         try:
             quantity = int(quantity_entry.get())
             price = float(price_per_share_entry.get())
@@ -75,13 +456,7 @@ def open_add_modal():
                 'settlement_date': settlement_entry.get(),
                 'deal_number': deal_entry.get()
             }
-            transactions = load_transactions()
-            transactions.append(transaction)
-            save_transactions(transactions)
-            filter_and_show_transactions()
-            update_stats()
-            update_filters()
-            plot_pie_chart(chart_frame)
+            run_in_background('add', add_transaction, transaction)
             modal.destroy()
         except ValueError:
             messagebox.showerror("Ошибка", "Проверьте правильность введенных числовых данных")
@@ -118,7 +493,7 @@ def open_add_modal():
     price_per_share_entry.grid(row=5, column=1, padx=5, pady=2)
 
     tk.Label(modal, text="Валюта", font=("Arial", 10, "bold")).grid(row=6, column=0, sticky="w", padx=5, pady=2)
-    currency_entry = ttk.Combobox(modal, values=['KZT', 'USD', 'EUR', 'RUB'])
+    currency_entry = ttk.Combobox(modal, values=fx.CURRENCIES)
     currency_entry.set('KZT')
     currency_entry.grid(row=6, column=1, padx=5, pady=2)
 
@@ -145,14 +520,23 @@ def open_edit_modal(event):
     selected = tree.selection()
     if not selected:
         return
-    item = tree.item(selected[0])
-    transaction_id = item['values'][7]
-    transactions = load_transactions()
-    transaction = next((t for t in transactions if t['id'] == transaction_id), None)
-    if not transaction:
+    # Строка ищется по ID из самой строки Treeview, а не по позиции.
+    transaction_id = tree.set(selected[0], 'ID')
+    rows = table_state['rows']
+    position = table_state['start'] + tree.index(selected[0])
+    if position < len(rows) and rows[position]['id'] == transaction_id:
+        transaction = rows[position]
+    else:
+        transaction = next((t for t in rows if t['id'] == transaction_id), None)
+    if transaction is None:
         return
 
     def submit():
+        try:
+            check_trade_date(date_entry.get())
+        except ValueError as error:
+            messagebox.showerror("Ошибка", f"Проверьте дату: {error}")
+            return
         try:
             quantity = int(quantity_entry.get())
             price = float(price_per_share_entry.get())
@@ -171,27 +555,14 @@ def open_edit_modal(event):
                 'settlement_date': settlement_entry.get(),
                 'deal_number': deal_entry.get()
             }
-            transactions = load_transactions()
-            index = next(i for i, t in enumerate(transactions) if t['id'] == transaction_id)
-            transactions[index] = updated_transaction
-            save_transactions(transactions)
-            filter_and_show_transactions()
-            update_stats()
-            update_filters()
-            plot_pie_chart(chart_frame)
+            run_in_background('edit', update_transaction, updated_transaction)
             modal.destroy()
         except ValueError:
             messagebox.showerror("Ошибка", "Проверьте правильность введенных числовых данных")
 
     def delete():
         if messagebox.askyesno("Подтверждение", "Вы уверены, что хотите удалить эту транзакцию?"):
-            transactions = load_transactions()
-            transactions = [t for t in transactions if t['id'] != transaction_id]
-            save_transactions(transactions)
-            filter_and_show_transactions()
-            update_stats()
-            update_filters()
-            plot_pie_chart(chart_frame)
+            run_in_background('delete', delete_transaction, transaction_id)
             modal.destroy()
 
     modal = tk.Toplevel(root)
@@ -230,7 +601,7 @@ def open_edit_modal(event):
     price_per_share_entry.grid(row=5, column=1, padx=5, pady=2)
 
     tk.Label(modal, text="Валюта", font=("Arial", 10, "bold")).grid(row=6, column=0, sticky="w", padx=5, pady=2)
-    currency_entry = ttk.Combobox(modal, values=['KZT', 'USD', 'EUR', 'RUB'])
+    currency_entry = ttk.Combobox(modal, values=fx.CURRENCIES)
     currency_entry.set(transaction['currency'])
     currency_entry.grid(row=6, column=1, padx=5, pady=2)
 
@@ -259,8 +630,10 @@ def open_edit_modal(event):
     tk.Button(modal, text="Сохранить", command=submit, bg="#2563EB", fg="white").grid(row=11, column=1, padx=5, pady=10, sticky="w")
 
 def run_app():
-    global root, filter_asset, filter_action, filter_broker, tree, empty_state, total_value_label, assets_count_label, transactions_count_label, chart_frame
+    global root, scheduler, filter_asset, filter_action, filter_broker, tree, table_scrollbar, empty_state, total_value_label, total_note_label, assets_count_label, transactions_count_label, chart_frame, pie_frame, dynamics_frame, dynamics_frequency, report_currency, report_rate_mode
+    first_frame = profiling.start_action('first_frame')
     root = tk.Tk()
+    scheduler = TaskScheduler(root)
     root.title("Инвестиционный трекер")
     root.configure(bg="#F3F4F6")
     root.state('zoomed')
@@ -279,6 +652,8 @@ def run_app():
     tk.Label(total_value_frame, text="Общая стоимость", bg="white", fg="#6B7280", font=("Arial", 10)).pack(padx=10, pady=5)
     total_value_label = tk.Label(total_value_frame, text="0 KZT", bg="white", font=("Arial", 16, "bold"))
     total_value_label.pack(padx=10, pady=5)
+    total_note_label = tk.Label(total_value_frame, text="", bg="white", fg="#B45309", font=("Arial", 9))
+    total_note_label.pack(padx=10)
 
     assets_count_frame = tk.Frame(stats_frame, bg="white", bd=1, relief="solid")
     assets_count_frame.pack(side=tk.LEFT, padx=5, fill=tk.X, expand=True)
@@ -292,6 +667,18 @@ def run_app():
     transactions_count_label = tk.Label(transactions_count_frame, text="0", bg="white", font=("Arial", 16, "bold"))
     transactions_count_label.pack(padx=10, pady=5)
 
+    report_currency_frame = tk.Frame(stats_frame, bg="white", bd=1, relief="solid")
+    report_currency_frame.pack(side=tk.LEFT, padx=5, fill=tk.X, expand=True)
+    tk.Label(report_currency_frame, text="Валюта отчёта", bg="white", fg="#6B7280", font=("Arial", 10)).pack(padx=10, pady=5)
+    report_currency = ttk.Combobox(report_currency_frame, values=fx.CURRENCIES, state='readonly', width=8)
+    report_currency.set(fx.get_base_currency())
+    report_currency.pack(padx=10, pady=2)
+    report_currency.bind('<<ComboboxSelected>>', lambda e: change_report_currency())
+    report_rate_mode = ttk.Combobox(report_currency_frame, values=list(RATE_MODE_LABELS), state='readonly', width=18)
+    report_rate_mode.set('По курсу сделки')
+    report_rate_mode.pack(padx=10, pady=2)
+    report_rate_mode.bind('<<ComboboxSelected>>', lambda e: change_report_currency())
+
     # Основной контент (диаграмма и таблица)
     main_frame = tk.Frame(root, bg="#F3F4F6")
     main_frame.pack(fill=tk.BOTH, expand=True, padx=20, pady=10)
@@ -300,6 +687,19 @@ def run_app():
     chart_frame = tk.Frame(main_frame, bg="white", bd=1, relief="solid")
     chart_frame.pack(side=tk.LEFT, fill=tk.BOTH, expand=True, padx=5)
     tk.Label(chart_frame, text="Распределение активов", font=("Arial", 14, "bold"), bg="white").pack(pady=5)
+    pie_frame = tk.Frame(chart_frame, bg="white")
+    pie_frame.pack(fill=tk.BOTH, expand=True)
+
+    # Динамика портфеля
+    dynamics_header = tk.Frame(chart_frame, bg="white")
+    dynamics_header.pack(fill=tk.X, pady=5)
+    tk.Label(dynamics_header, text="Динамика портфеля", font=("Arial", 14, "bold"), bg="white").pack(side=tk.LEFT, padx=10)
+    dynamics_frequency = ttk.Combobox(dynamics_header, values=list(DYNAMICS_FREQUENCIES), state='readonly', width=10)
+    dynamics_frequency.set('Месяцы')
+    dynamics_frequency.pack(side=tk.RIGHT, padx=10)
+    dynamics_frequency.bind('<<ComboboxSelected>>', lambda e: refresh_summary(profiling.start_action('dynamics')))
+    dynamics_frame = tk.Frame(chart_frame, bg="white")
+    dynamics_frame.pack(fill=tk.BOTH, expand=True)
 
     # Таблица транзакций
     transactions_frame = tk.Frame(main_frame, bg="white", bd=1, relief="solid")
@@ -310,6 +710,9 @@ def run_app():
     transactions_header.pack(fill=tk.X, pady=5)
     tk.Label(transactions_header, text="Транзакции", font=("Arial", 14, "bold"), bg="white").pack(side=tk.LEFT, padx=10)
     tk.Button(transactions_header, text="Добавить транзакцию", command=open_add_modal, bg="#2563EB", fg="white").pack(side=tk.RIGHT, padx=10)
+    tk.Button(transactions_header, text="Прибыль и убыток", command=open_pnl_window).pack(side=tk.RIGHT, padx=5)
+    tk.Button(transactions_header, text="Экспорт", command=export_transactions).pack(side=tk.RIGHT, padx=5)
+    tk.Button(transactions_header, text="Импорт", command=import_transactions).pack(side=tk.RIGHT, padx=5)
 
     # Фильтры
     filters_frame = tk.Frame(transactions_frame, bg="#F9FAFB")
@@ -319,34 +722,35 @@ def run_app():
     filter_asset = ttk.Combobox(filters_frame, values=['Все активы'])
     filter_asset.set('Все активы')
     filter_asset.pack(side=tk.LEFT, padx=5)
-    filter_asset.bind('<<ComboboxSelected>>', lambda e: filter_and_show_transactions())
+    filter_asset.bind('<<ComboboxSelected>>', lambda e: filter_and_show_transactions(profiling.start_action('filter')))
 
     tk.Label(filters_frame, text="Действие", bg="#F9FAFB", font=("Arial", 10, "bold")).pack(side=tk.LEFT, padx=5)
     filter_action = ttk.Combobox(filters_frame, values=['Все действия', 'Покупка', 'Продажа'])
     filter_action.set('Все действия')
     filter_action.pack(side=tk.LEFT, padx=5)
-    filter_action.bind('<<ComboboxSelected>>', lambda e: filter_and_show_transactions())
+    filter_action.bind('<<ComboboxSelected>>', lambda e: filter_and_show_transactions(profiling.start_action('filter')))
 
     tk.Label(filters_frame, text="Брокер", bg="#F9FAFB", font=("Arial", 10, "bold")).pack(side=tk.LEFT, padx=5)
     filter_broker = ttk.Combobox(filters_frame, values=['Все брокеры'])
     filter_broker.set('Все брокеры')
     filter_broker.pack(side=tk.LEFT, padx=5)
-    filter_broker.bind('<<ComboboxSelected>>', lambda e: filter_and_show_transactions())
+    filter_broker.bind('<<ComboboxSelected>>', lambda e: filter_and_show_transactions(profiling.start_action('filter')))
 
     # Таблица
-    global tree
-    tree = ttk.Treeview(transactions_frame, columns=('Дата', 'Актив', 'Действие', 'Кол-во', 'Цена', 'Сумма', 'Брокер', 'ID'), show='headings')
-    tree.heading('Дата', text='Дата')
-    tree.heading('Актив', text='Актив')
-    tree.heading('Действие', text='Действие')
-    tree.heading('Кол-во', text='Кол-во')
-    tree.heading('Цена', text='Цена')
-    tree.heading('Сумма', text='Сумма')
-    tree.heading('Брокер', text='Брокер')
+    global tree, table_scrollbar
+    ttk.Style().configure('Treeview', rowheight=ROW_HEIGHT)
+    table_scrollbar = ttk.Scrollbar(transactions_frame, orient=tk.VERTICAL, command=on_table_scroll)
+    table_scrollbar.pack(side=tk.RIGHT, fill=tk.Y, pady=5)
+    tree = ttk.Treeview(transactions_frame, columns=TABLE_COLUMNS, show='headings', yscrollcommand=on_tree_yview)
+    for column in SORT_KEYS:
+        tree.heading(column, text=column, command=lambda c=column: sort_transactions_by(c))
     tree.heading('ID', text='')
     tree.column('ID', width=0, stretch=False)
+    tree.tag_configure('Покупка', background='#D1FAE5')
+    tree.tag_configure('Продажа', background='#FEE2E2')
     tree.pack(fill=tk.BOTH, expand=True, padx=5, pady=5)
     tree.bind('<Double-1>', open_edit_modal)
+    tree.bind('<Configure>', lambda e: render_table_window())
 
     # Пустое состояние
     global empty_state
@@ -356,9 +760,13 @@ def run_app():
     tk.Button(empty_state, text="Добавить первую транзакцию", command=open_add_modal, bg="#2563EB", fg="white").pack(pady=10)
 
     # Инициализация
-    update_stats()
-    update_filters()
-    plot_pie_chart(chart_frame)
-    filter_and_show_transactions()
+    root.bind_all('<Control-Shift-KeyPress-P>', lambda e: open_profile_panel())
+    # matplotlib загружается в отдельном потоке параллельно с пересчётом,
+    # чтобы первый график не импортировал его в потоке Tk.
+    threading.Thread(target=load_chart_backend, daemon=True).start()
+    # Проверка снимка — первая задача рабочего потока, она занимает миллисекунды.
+    scheduler.submit(load_startup_snapshot, on_done=show_startup_snapshot)
+    refresh_all(profiling.start_action('startup'))
+    root.after_idle(profiling.finish_action, first_frame)
 
     root.mainloop() 
\ No newline at end of file